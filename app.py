@@ -3,6 +3,7 @@ import os
 import json
 import uuid
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from flask import (
@@ -12,11 +13,27 @@ from flask import (
     jsonify,
     redirect,
     url_for,
-    send_from_directory,
+    send_file,
     abort,
 )
 
 from services.ai_service import DocumentAIClient
+from services.asset_service import AssetPipeline, IMMUTABLE_CACHE_CONTROL
+from services.cache_service import AnswerCache
+from services.deadline_service import CancellationRegistry, DeadlineExceeded
+from services.blob_service import (
+    BLOB_SECTIONS,
+    BlobStore,
+    analysis_sections,
+    collect_blob_refs,
+    externalize_analysis,
+    externalize_documents,
+    hydrate_analysis,
+    needs_externalize,
+)
+from services.image_service import image_variant_keys, ingest_image, is_image_key
+from services.scheduler_service import ModelCallScheduler
+from services.storage_service import create_storage
 from services.document_service import (
     save_uploaded_file,
     download_file_from_url,
@@ -29,15 +46,53 @@ from services.document_service import (
 
 BASE_DIR = Path(__file__).resolve().parent
 UPLOAD_FOLDER = BASE_DIR / "uploads"
+STORAGE_CACHE_FOLDER = Path(os.environ.get("STORAGE_CACHE_DIR", BASE_DIR / "cache" / "storage"))
 DATA_FILE = BASE_DIR / "data" / "metadata.json"
+ASSET_DIST_FOLDER = BASE_DIR / "build" / "static"
+BLOB_FOLDER = BASE_DIR / "data" / "blobs"
+SCHEDULER_DB = BASE_DIR / "data" / "scheduler.db"
 
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024  # 64MB
+app.config["MAX_COMPARE_DOCS"] = int(os.environ.get("MAX_COMPARE_DOCS", "10"))
+app.config["ANALYSIS_BUDGET_SECONDS"] = float(os.environ.get("ANALYSIS_BUDGET_SECONDS", "300"))
+app.config["ASK_BUDGET_SECONDS"] = float(os.environ.get("ASK_BUDGET_SECONDS", "90"))
+
+storage = create_storage(UPLOAD_FOLDER, STORAGE_CACHE_FOLDER)
+
+# 生产环境先执行 python -m services.asset_service 预构建；启动时仅在 manifest 缺失或过期时才构建
+asset_pipeline = AssetPipeline(BASE_DIR / "static", ASSET_DIST_FOLDER)
+asset_pipeline.load_or_build()
+hashed_assets = set(asset_pipeline.manifest.values())
+
+blob_store = BlobStore(BLOB_FOLDER)
 
-UPLOAD_FOLDER.mkdir(exist_ok=True, parents=True)
 
-ai_client = DocumentAIClient()
+def _migrate_inline_analysis():
+    """启动时一次性把旧版内联的分析结果迁入 BlobStore，已迁移的记录会被跳过"""
+    documents = load_documents(DATA_FILE)
+    if externalize_documents(blob_store, documents):
+        store_documents(DATA_FILE, documents)
+
+
+_migrate_inline_analysis()
+ai_client = DocumentAIClient(
+    scheduler=ModelCallScheduler.from_env(SCHEDULER_DB),
+    answer_cache=AnswerCache(SCHEDULER_DB, max_entries=int(os.getenv("DASHSCOPE_ANSWER_CACHE_SIZE", "2000"))),
+)
+cancellations = CancellationRegistry(SCHEDULER_DB)
+
+
+@app.context_processor
+def inject_asset_url():
+    def asset_url(filename: str) -> str:
+        hashed = asset_pipeline.hashed_name(filename)
+        if hashed:
+            return url_for("hashed_asset", filename=hashed)
+        return url_for("static", filename=filename)
+
+    return {"asset_url": asset_url}
 
 
 def get_document_or_404(doc_id: str):
@@ -48,6 +103,60 @@ def get_document_or_404(doc_id: str):
     abort(404)
 
 
+def _document_path(document) -> Path:
+    """返回文档在本机可读的路径；对象存储后端会经本地缓存下载"""
+    return storage.local_path(document["filename"])
+
+
+def _request_deadline(default_budget: float):
+    """按 X-Request-Id / X-Request-Budget 请求头构造本次请求的时间预算与取消标记"""
+    budget = default_budget
+    raw_budget = request.headers.get("X-Request-Budget", "").strip()
+    try:
+        if raw_budget and float(raw_budget) > 0:
+            budget = min(budget, float(raw_budget))
+    except ValueError:
+        pass
+    request_id = request.headers.get("X-Request-Id", "").strip()[:64]
+    return cancellations.deadline_for(request_id or None, budget)
+
+
+def _document_text(document, deadline=None) -> str:
+    """优先读取已缓存的提取文本，避免重复解析原文件或重复 OCR"""
+    if document.get("text_blob"):
+        cached = blob_store.get_text(document["text_blob"])
+        if cached is not None:
+            return cached
+    ocr_path = None
+    ocr_key = (document.get("image") or {}).get("ocr_variant")
+    if ocr_key:
+        # OCR 预处理图缺失（被清理或生成失败）时退回原文件
+        try:
+            ocr_path = storage.local_path(ocr_key)
+        except FileNotFoundError:
+            ocr_path = None
+        if ocr_path is not None and not ocr_path.exists():
+            ocr_path = None
+    try:
+        return extract_preview_text(_document_path(document), ocr_path=ocr_path, deadline=deadline)
+    except FileNotFoundError:
+        return ""
+
+
+def _ingest_image(document) -> bool:
+    """为图片文档生成展示/OCR 变体，返回记录是否有更新"""
+    if not is_image_key(document["filename"]) or document.get("image"):
+        return False
+    try:
+        image_info = ingest_image(storage, document["filename"])
+    except Exception:  # pylint: disable=broad-except
+        image_info = None
+    if not image_info:
+        return False
+    document["image"] = image_info
+    return True
+
+
 @app.route("/")
 def index():
     documents = load_documents(DATA_FILE)
@@ -57,18 +166,23 @@ def index():
 
 @app.route("/reader/<doc_id>")
 def reader(doc_id):
-    document, _ = get_document_or_404(doc_id)
-    file_path = Path(document["filepath"])
+    document, documents = get_document_or_404(doc_id)
+    try:
+        file_path = _document_path(document)
+    except FileNotFoundError:
+        abort(404)
     preview_type = "pdf"
-    if file_path.suffix.lower() in {".png", ".jpg", ".jpeg", ".gif", ".webp"}:
+    if is_image_key(file_path.name):
         preview_type = "image"
+        if _ingest_image(document):
+            store_documents(DATA_FILE, documents)
     elif file_path.suffix.lower() not in {".pdf"}:
         preview_type = "text"
 
     page_markers = build_page_markers(file_path)
     preview_text = ""
     if preview_type == "text":
-        preview_text = extract_preview_text(file_path)[:800] or "暂不支持该文件预览，请尝试下载后查看。"
+        preview_text = _document_text(document)[:800] or "暂不支持该文件预览，请尝试下载后查看。"
     show_thumbnails = preview_type == "pdf" and len(page_markers) > 1
     return render_template(
         "reader.html",
@@ -82,7 +196,26 @@ def reader(doc_id):
 
 @app.route("/uploads/<path:filename>")
 def uploaded_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    try:
+        file_path = storage.local_path(filename)
+    except FileNotFoundError:
+        abort(404)
+    if not file_path.is_file():
+        abort(404)
+    return send_file(file_path, download_name=Path(filename).name, conditional=True)
+
+
+@app.route("/assets/<path:filename>")
+def hashed_asset(filename):
+    if filename not in hashed_assets:
+        abort(404)
+    file_path, encoding = asset_pipeline.pick_variant(filename, request.accept_encodings)
+    response = send_file(file_path, mimetype=AssetPipeline.guess_mimetype(filename), conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
 
 
 @app.route("/api/documents", methods=["GET"])
@@ -103,14 +236,18 @@ def _remove_document_entry(documents, doc_id):
     if not target:
         return False
 
-    filepath = Path(target["filepath"])
-    if filepath.exists():
+    for key in [target["filename"], *image_variant_keys(target)]:
         try:
-            filepath.unlink()
-        except OSError:
+            storage.delete(key)
+        except Exception:  # pylint: disable=broad-except
             pass
 
     documents.remove(target)
+    still_used = set()
+    for doc in documents:
+        still_used |= collect_blob_refs(doc)
+    for ref in collect_blob_refs(target) - still_used:
+        blob_store.delete(ref)
     return True
 
 
@@ -132,6 +269,26 @@ def api_clear_documents():
     return jsonify({"success": True})
 
 
+def _save_analysis_progress(document, documents, progress):
+    """超时/取消/繁忙时保存已完成的分析步骤，下一次请求从断点继续"""
+    if not progress:
+        store_documents(DATA_FILE, documents)
+        return
+    previous = document.get("analysis_progress")
+    document["analysis_progress"] = blob_store.put_text(json.dumps(progress, ensure_ascii=False))
+    store_documents(DATA_FILE, documents)
+    if previous and all(previous not in collect_blob_refs(doc) for doc in documents):
+        blob_store.delete(previous)
+
+
+def _drop_analysis_progress(document, documents):
+    previous = document.pop("analysis_progress", None)
+    if not previous:
+        return
+    if all(previous not in collect_blob_refs(doc) for doc in documents):
+        blob_store.delete(previous)
+
+
 @app.route("/api/documents/<doc_id>/analysis", methods=["GET"])
 def api_document_analysis(doc_id):
     document, documents = get_document_or_404(doc_id)
@@ -141,25 +298,82 @@ def api_document_analysis(doc_id):
     current_version = str(analysis_payload.get("_version") or "").strip()
     needs_refresh = (
         not analysis_payload
-        or not required_keys.issubset(analysis_payload.keys())
+        or not required_keys.issubset(analysis_sections(analysis_payload))
         or current_version != "2"
     )
 
     if needs_refresh:
-        file_path = Path(document["filepath"])
-        preview_text = extract_preview_text(file_path)
+        deadline = _request_deadline(app.config["ANALYSIS_BUDGET_SECONDS"])
+        file_path = Path(document["filename"])
+        try:
+            preview_text = _document_text(document, deadline)
+        except DeadlineExceeded:
+            return jsonify({"success": False, "partial": False, "error": "文档解析已取消或超时，请重试"}), 504
+        if preview_text and not document.get("text_blob"):
+            document["text_blob"] = blob_store.put_text(preview_text)
         if not preview_text:
             preview_text = f"文件名: {document['original_name']}\n文件类型: {file_path.suffix}\n请基于文件名和上下文给予大致分析。"
 
-        analysis = ai_client.generate_document_insights(
-            preview_text,
-            document["original_name"],
-        )
-        document["analysis"] = analysis
+        progress = {}
+        if document.get("analysis_progress"):
+            try:
+                progress = json.loads(blob_store.get_text(document["analysis_progress"]) or "{}")
+            except json.JSONDecodeError:
+                progress = {}
+
+        try:
+            analysis = ai_client.generate_document_insights(
+                preview_text,
+                document["original_name"],
+                deadline=deadline,
+                progress=progress,
+            )
+        except DeadlineExceeded:
+            _save_analysis_progress(document, documents, progress)
+            return jsonify({"success": False, "partial": True, "error": "AI 解读已取消或超时，已保存进度，重试将继续生成"}), 504
+        if analysis.get("_busy"):
+            _save_analysis_progress(document, documents, progress)
+            return jsonify({"success": False, "busy": True, "error": "AI 服务繁忙，请稍后重试"}), 503
+        document["analysis"] = externalize_analysis(blob_store, analysis)
         document["classification"] = analysis.get("category", "")
+        _drop_analysis_progress(document, documents)
+        store_documents(DATA_FILE, documents)
+    elif needs_externalize(analysis_payload):
+        document["analysis"] = externalize_analysis(blob_store, analysis_payload)
         store_documents(DATA_FILE, documents)
 
-    return jsonify({"success": True, "analysis": document["analysis"]})
+    sections = None
+    raw_sections = (request.args.get("sections") or "").strip()
+    if raw_sections:
+        sections = [item.strip() for item in raw_sections.split(",") if item.strip() in BLOB_SECTIONS]
+    return jsonify({"success": True, "analysis": hydrate_analysis(blob_store, document["analysis"], sections)})
+
+
+def _answer_response(answer: str):
+    if ai_client.is_busy(answer):
+        return jsonify({"success": False, "busy": True, "error": "AI 服务繁忙，请稍后重试"}), 503
+    return jsonify({"success": True, "answer": answer})
+
+
+def _collect_compare_ids(payload, doc_id):
+    """解析对比文档 id 列表；compare_doc_ids 既不是列表也不是字符串时返回 None"""
+    raw_ids = payload.get("compare_doc_ids")
+    if raw_ids is None:
+        raw_ids = []
+    elif isinstance(raw_ids, str):
+        raw_ids = [raw_ids]
+    elif not isinstance(raw_ids, list):
+        return None
+    legacy_id = payload.get("compare_doc_id")
+    if legacy_id:
+        raw_ids = [legacy_id, *raw_ids]
+
+    compare_ids = []
+    for raw_id in raw_ids:
+        compare_id = str(raw_id or "").strip()
+        if compare_id and compare_id != doc_id and compare_id not in compare_ids:
+            compare_ids.append(compare_id)
+    return compare_ids
 
 
 @app.route("/api/documents/<doc_id>/ask", methods=["POST"])
@@ -169,28 +383,53 @@ def api_document_ask(doc_id):
     if not question:
         return jsonify({"success": False, "error": "请输入有效的问题"}), 400
 
-    document, _ = get_document_or_404(doc_id)
-    file_path = Path(document["filepath"])
-    preview_text = extract_preview_text(file_path)
-    compare_id = (payload.get("compare_doc_id") or "").strip()
-    if compare_id and compare_id != doc_id:
-        compare_doc, _ = get_document_or_404(compare_id)
-        compare_path = Path(compare_doc["filepath"])
-        compare_text = extract_preview_text(compare_path)
-        answer = ai_client.ask_about_documents(
-            question=question,
-            primary_filename=document["original_name"],
-            primary_excerpt=preview_text,
-            secondary_filename=compare_doc["original_name"],
-            secondary_excerpt=compare_text,
-        )
-    else:
-        answer = ai_client.ask_about_document(
+    compare_ids = _collect_compare_ids(payload, doc_id)
+    if compare_ids is None:
+        return jsonify({"success": False, "error": "compare_doc_ids 格式不正确"}), 400
+    if len(compare_ids) + 1 > app.config["MAX_COMPARE_DOCS"]:
+        return jsonify({"success": False, "error": f"最多同时对比 {app.config['MAX_COMPARE_DOCS']} 份文档"}), 400
+
+    document, documents = get_document_or_404(doc_id)
+    by_id = {doc["id"]: doc for doc in documents}
+    targets = [document]
+    for compare_id in compare_ids:
+        if compare_id not in by_id:
+            abort(404)
+        targets.append(by_id[compare_id])
+
+    deadline = _request_deadline(app.config["ASK_BUDGET_SECONDS"])
+    try:
+        if len(targets) == 1:
+            answer = ai_client.ask_about_document(
+                question=question,
+                filename=document["original_name"],
+                document_excerpt=_document_text(document, deadline),
+                deadline=deadline,
+            )
+            return _answer_response(answer)
+
+        with ThreadPoolExecutor(max_workers=min(len(targets), 8)) as executor:
+            texts = list(executor.map(lambda doc: _document_text(doc, deadline), targets))
+
+        answer = ai_client.ask_about_multiple_documents(
             question=question,
-            filename=document["original_name"],
-            document_excerpt=preview_text,
+            documents=[(doc["original_name"], text) for doc, text in zip(targets, texts)],
+            deadline=deadline,
         )
-    return jsonify({"success": True, "answer": answer})
+    except DeadlineExceeded:
+        return jsonify({"success": False, "error": "提问已取消或超时，请重试"}), 504
+    return _answer_response(answer)
+
+
+@app.route("/api/requests/<request_id>/cancel", methods=["POST"])
+def api_cancel_request(request_id):
+    cancellations.cancel(request_id[:64])
+    return jsonify({"success": True})
+
+
+@app.route("/api/scheduler/metrics", methods=["GET"])
+def api_scheduler_metrics():
+    return jsonify({"success": True, "metrics": ai_client.scheduler.metrics()})
 
 
 @app.route("/upload", methods=["POST"])
@@ -202,21 +441,21 @@ def upload():
     if file.filename == "":
         return jsonify({"success": False, "error": "请选择文件"}), 400
 
-    saved_file, original_name = save_uploaded_file(
+    storage_key, original_name = save_uploaded_file(
         file=file,
-        upload_dir=app.config["UPLOAD_FOLDER"],
+        storage=storage,
     )
 
     doc_entry = {
         "id": uuid.uuid4().hex,
-        "filename": saved_file.name,
+        "filename": storage_key,
         "original_name": original_name,
-        "filepath": str(saved_file),
-        "size": saved_file.stat().st_size,
+        "size": storage.size(storage_key),
         "uploaded_at": datetime.datetime.utcnow().isoformat(),
         "analysis": None,
         "classification": "",
     }
+    _ingest_image(doc_entry)
 
     documents = load_documents(DATA_FILE)
     documents.append(doc_entry)
@@ -239,9 +478,9 @@ def api_import_url():
         return jsonify({"success": False, "error": "请输入有效的链接"}), 400
 
     try:
-        saved_file, original_name = download_file_from_url(
+        storage_key, original_name = download_file_from_url(
             url=url,
-            upload_dir=app.config["UPLOAD_FOLDER"],
+            storage=storage,
             max_bytes=app.config["MAX_CONTENT_LENGTH"],
         )
     except ValueError as exc:
@@ -251,14 +490,14 @@ def api_import_url():
 
     doc_entry = {
         "id": uuid.uuid4().hex,
-        "filename": saved_file.name,
+        "filename": storage_key,
         "original_name": original_name,
-        "filepath": str(saved_file),
-        "size": saved_file.stat().st_size,
+        "size": storage.size(storage_key),
         "uploaded_at": datetime.datetime.utcnow().isoformat(),
         "analysis": None,
         "classification": "",
     }
+    _ingest_image(doc_entry)
 
     documents = load_documents(DATA_FILE)
     documents.append(doc_entry)
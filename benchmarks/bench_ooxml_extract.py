@@ -0,0 +1,127 @@
+"""
+DOCX 提取性能对比：流式 OOXML 解析 vs python-docx。
+
+用法：
+    python -m benchmarks.bench_ooxml_extract                 # 自动生成样例文档
+    python -m benchmarks.bench_ooxml_extract --file a.docx   # 使用现有文档
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from services.ooxml_service import extract_docx_text
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Default Extension="png" ContentType="image/png"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    "</Types>"
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    "</Relationships>"
+)
+
+
+def build_sample_docx(target: Path, *, paragraphs: int, table_rows: int, media_mb: int):
+    body = []
+    for index in range(paragraphs):
+        text = escape(f"第 {index + 1} 段：这是一段用于性能测试的正文内容，包含中文与 English mixed text。")
+        body.append(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>")
+        if table_rows and index == paragraphs // 2:
+            rows = "".join(
+                f"<w:tr><w:tc><w:p><w:r><w:t>行 {row}</w:t></w:r></w:p></w:tc>"
+                f"<w:tc><w:p><w:r><w:t>{row * 3.5}</w:t></w:r></w:p></w:tc></w:tr>"
+                for row in range(table_rows)
+            )
+            body.append(f"<w:tbl>{rows}</w:tbl>")
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{''.join(body)}</w:body></w:document>"
+    )
+    with zipfile.ZipFile(str(target), "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("word/document.xml", document)
+        if media_mb:
+            # 模拟体积很大的内嵌图片，随机数据基本不可压缩
+            archive.writestr(
+                zipfile.ZipInfo("word/media/image1.png"),
+                os.urandom(media_mb * 1024 * 1024),
+                compress_type=zipfile.ZIP_STORED,
+            )
+
+
+def python_docx_extract(file_path: Path) -> str:
+    from docx import Document  # type: ignore
+
+    document = Document(str(file_path))
+    paragraphs = [p.text for p in document.paragraphs if p.text.strip()]
+    return "\n".join(paragraphs[:100])
+
+
+def measure(func, file_path: Path, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file_path)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    text = func(file_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", type=Path, help="待测试的 DOCX 文件，不指定时自动生成")
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--table-rows", type=int, default=500)
+    parser.add_argument("--media-mb", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = args.file
+        if file_path is None:
+            file_path = Path(tmp_dir) / "sample.docx"
+            build_sample_docx(
+                file_path,
+                paragraphs=args.paragraphs,
+                table_rows=args.table_rows,
+                media_mb=args.media_mb,
+            )
+        print(f"文件: {file_path} ({file_path.stat().st_size / 1024 / 1024:.1f} MB)")
+
+        candidates = [("streaming", lambda path: extract_docx_text(path, max_chars=12000))]
+        try:
+            import docx  # type: ignore  # noqa: F401
+
+            candidates.append(("python-docx", python_docx_extract))
+        except ImportError:
+            print("未安装 python-docx，跳过对照组")
+
+        print(f"{'方法':<14}{'耗时(ms)':>12}{'峰值内存(KB)':>16}{'字符数':>10}")
+        for name, func in candidates:
+            elapsed, peak, chars = measure(func, file_path, args.repeat)
+            print(f"{name:<14}{elapsed * 1000:>12.1f}{peak / 1024:>16.1f}{chars:>10}")
+
+
+if __name__ == "__main__":
+    main()
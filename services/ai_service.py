@@ -1,5 +1,8 @@
+import hashlib
 import os
-from typing import Dict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 try:
     import dashscope
@@ -8,28 +11,61 @@ except ImportError:  # pragma: no cover
     dashscope = None
     Generation = None
 
+from .cache_service import AnswerCache
+from .deadline_service import Deadline, check_deadline
+from .scheduler_service import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, ModelCallScheduler
+
 
 class DocumentAIClient:
     """轻量封装 DashScope DeepSeek 接口，用于文档阅读助手场景"""
 
     ERROR_PREFIXES = ("调用 DashScope 失败", "调用 DeepSeek 失败")
+    BUSY_MESSAGE = "调用 DashScope 失败: 服务繁忙，请稍后重试"
 
-    def __init__(self):
+    def __init__(
+        self,
+        scheduler: Optional[ModelCallScheduler] = None,
+        answer_cache: Optional[AnswerCache] = None,
+    ):
+        self.scheduler = scheduler
+        self.answer_cache = answer_cache
         self.api_key = os.getenv("DASHSCOPE_API_KEY", "").strip()
         self.model = os.getenv("DASHSCOPE_MODEL", "deepseek-v3.2").strip()
         self.finance_model = os.getenv("DASHSCOPE_FINANCE_MODEL", "").strip()
         self.temperature = float(os.getenv("DASHSCOPE_TEMPERATURE", "0.4"))
         self.enable_thinking = os.getenv("DASHSCOPE_ENABLE_THINKING", "1") != "0"
         base_url = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/api/v1")
+        self.request_timeout = float(os.getenv("DASHSCOPE_REQUEST_TIMEOUT", "300"))
+        self.ask_char_budget = int(os.getenv("DASHSCOPE_ASK_CHAR_BUDGET", "12000"))
+        self.ask_max_workers = int(os.getenv("DASHSCOPE_ASK_MAX_WORKERS", "4"))
+        self.ask_min_excerpt_chars = int(os.getenv("DASHSCOPE_ASK_MIN_EXCERPT_CHARS", "1500"))
 
         if dashscope is not None:
             dashscope.base_http_api_url = base_url
 
-    def _request(self, system_prompt: str, user_prompt: str, *, model: str = None) -> str:
+    def is_busy(self, text: str) -> bool:
+        return isinstance(text, str) and self.BUSY_MESSAGE in text
+
+    def _request(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        *,
+        model: str = None,
+        priority: int = PRIORITY_BACKGROUND,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        check_deadline(deadline)
         if Generation is None:
             return "调用 DashScope 失败: 未安装 dashscope SDK，请先 pip install dashscope"
         if not self.api_key:
             return "调用 DashScope 失败: 未配置 DASHSCOPE_API_KEY，无法生成内容。"
+        if self.scheduler is not None:
+            wait_budget = deadline.remaining() if deadline is not None else None
+            if not self.scheduler.acquire(model or self.model, priority, timeout=wait_budget):
+                check_deadline(deadline)
+                return self.BUSY_MESSAGE
+            check_deadline(deadline)
 
         messages = [
             {"role": "system", "content": system_prompt},
@@ -41,6 +77,8 @@ class DocumentAIClient:
             "messages": messages,
             "result_format": "message",
             "temperature": self.temperature,
+            # SDK 的 HTTP 超时不超过剩余预算，超时后不会在后台继续占着连接
+            "request_timeout": deadline.timeout(self.request_timeout) if deadline else self.request_timeout,
         }
         if self.enable_thinking:
             call_kwargs["enable_thinking"] = True
@@ -48,6 +86,7 @@ class DocumentAIClient:
         try:
             response = Generation.call(**call_kwargs)
         except Exception as exc:  # pylint: disable=broad-except
+            check_deadline(deadline)
             return f"调用 DashScope 失败: {exc}"
 
         if getattr(response, "status_code", None) == 200:
@@ -62,7 +101,15 @@ class DocumentAIClient:
         error_msg = getattr(response, "message", "unknown error")
         return f"调用 DashScope 失败: {error_code} - {error_msg}"
 
-    def _call_models(self, system_prompt: str, user_prompt: str, *, prefer_finance: bool = False) -> str:
+    def _call_models(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        *,
+        prefer_finance: bool = False,
+        priority: int = PRIORITY_BACKGROUND,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
         models: list[str] = []
         if prefer_finance and self.finance_model and self.finance_model != self.model:
             models.append(self.finance_model)
@@ -70,7 +117,13 @@ class DocumentAIClient:
 
         last_response = ""
         for model_name in models:
-            response = self._request(system_prompt, user_prompt, model=model_name)
+            response = self._request(
+                system_prompt,
+                user_prompt,
+                model=model_name,
+                priority=priority,
+                deadline=deadline,
+            )
             last_response = response
             if not any(response.startswith(prefix) for prefix in self.ERROR_PREFIXES):
                 return response
@@ -83,7 +136,7 @@ class DocumentAIClient:
         """
         return ""
 
-    def summarize_document(self, ocr_text: str, filename: str) -> str:
+    def summarize_document(self, ocr_text: str, filename: str, *, deadline: Optional[Deadline] = None) -> str:
         system_prompt = (
             "你是一名文档阅读助手，善于迅速提炼长文档的关键信息。"
             "输出需使用流畅的中文，力求简洁明了，避免 JSON 或编号列表。"
@@ -94,9 +147,17 @@ class DocumentAIClient:
             f"{ocr_text[:4000]}\n"
             "请概括 2-3 个核心要点，每个要点独立成句，并使用换行分隔。"
         )
-        return self._call_models(system_prompt, user_prompt, prefer_finance=True)
+        return self._call_models(system_prompt, user_prompt, prefer_finance=True, deadline=deadline)
 
-    def deep_read_document(self, category: str, summary: str, ocr_text: str, filename: str) -> str:
+    def deep_read_document(
+        self,
+        category: str,
+        summary: str,
+        ocr_text: str,
+        filename: str,
+        *,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
         category_hint = category.strip() or "未分类"
         summary_hint = ""
         if summary and not any(summary.startswith(prefix) for prefix in self.ERROR_PREFIXES) and not summary.strip().startswith("总结失败"):
@@ -113,7 +174,7 @@ class DocumentAIClient:
             f"文档摘要(如有):\n{summary_hint}\n"
             "请输出精读要点：背景/问题、核心论点、关键证据、结论或启发，各点独立成句，8-12 行，允许适当扩展说明。"
         )
-        return self._call_models(system_prompt, user_prompt, prefer_finance=True)
+        return self._call_models(system_prompt, user_prompt, prefer_finance=True, deadline=deadline)
 
     def explain_document(self, category: str, summary: str, ocr_text: str, filename: str) -> str:
         return self.deep_read_document(category, summary, ocr_text, filename)
@@ -144,7 +205,56 @@ class DocumentAIClient:
             chunks.append("\n".join(current))
         return chunks
 
-    def translate_document(self, summary: str, ocr_text: str, filename: str) -> str:
+    @staticmethod
+    def _question_terms(question: str) -> set[str]:
+        terms = {word.lower() for word in re.findall(r"[A-Za-z0-9]{2,}", question)}
+        for segment in re.findall(r"[\u4e00-\u9fff]+", question):
+            if len(segment) == 1:
+                terms.add(segment)
+            terms.update(segment[i : i + 2] for i in range(len(segment) - 1))
+        return terms
+
+    @classmethod
+    def _select_relevant_excerpt(cls, text: str, question: str, *, max_chars: int) -> str:
+        """按问题关键词挑选最相关的段落，拼接后不超过 max_chars，保持原文顺序"""
+        text = text or ""
+        if len(text) <= max_chars:
+            return text
+
+        chunks = cls._chunk_text(text, max_chars=min(800, max_chars), max_chunks=200)
+        terms = cls._question_terms(question)
+        scored = []
+        for index, chunk in enumerate(chunks):
+            lowered = chunk.lower()
+            score = sum(lowered.count(term) for term in terms)
+            scored.append((score, -index, index))
+        scored.sort(reverse=True)
+
+        picked: list[int] = []
+        used = 0
+        for _, _, index in scored:
+            length = len(chunks[index]) + 1
+            if used + length > max_chars:
+                continue
+            picked.append(index)
+            used += length
+        if not picked:
+            return chunks[0][:max_chars]
+        return "\n".join(chunks[index] for index in sorted(picked))
+
+    def translate_document(
+        self,
+        summary: str,
+        ocr_text: str,
+        filename: str,
+        *,
+        deadline: Optional[Deadline] = None,
+        done_parts: Optional[list] = None,
+    ) -> str:
+        """
+        分段翻译。done_parts 记录已成功翻译的分段（未完成为 None），会被原地更新，
+        超时或取消后保留下来，重试时跳过已完成的分段。
+        """
         summary_hint = ""
         if summary and not any(summary.startswith(prefix) for prefix in self.ERROR_PREFIXES) and not summary.strip().startswith("总结失败"):
             summary_hint = summary
@@ -157,21 +267,33 @@ class DocumentAIClient:
 
         source_text = (ocr_text or "")[:12000]
         chunks = self._chunk_text(source_text, max_chars=1800, max_chunks=6)
-        translated_parts: list[str] = []
         total = len(chunks)
+        if done_parts is None:
+            done_parts = []
+        if len(done_parts) != total:
+            done_parts[:] = [None] * total
+        translated_parts: list[str] = list(done_parts)
 
         for idx, chunk in enumerate(chunks, start=1):
+            if done_parts[idx - 1] is not None:
+                continue
             user_prompt = (
                 f"文件名: {filename}\n"
                 f"文档摘要(如有):\n{summary_hint}\n"
                 f"待翻译内容（第 {idx}/{total} 段）：\n{chunk}\n"
                 "请逐句翻译，保证术语一致、语义完整。"
             )
-            translated_parts.append(self._call_models(system_prompt, user_prompt, prefer_finance=False).strip())
+            part = self._call_models(system_prompt, user_prompt, prefer_finance=False, deadline=deadline).strip()
+            if self.is_busy(part):
+                # 服务繁忙时后续分段同样会失败，直接返回，已完成的分段保留在 done_parts 中
+                return self.BUSY_MESSAGE
+            translated_parts[idx - 1] = part
+            if not any(part.startswith(prefix) for prefix in self.ERROR_PREFIXES):
+                done_parts[idx - 1] = part
 
         return "\n\n".join([part for part in translated_parts if part])
 
-    def mindmap_document(self, summary: str, ocr_text: str, filename: str) -> str:
+    def mindmap_document(self, summary: str, ocr_text: str, filename: str, *, deadline: Optional[Deadline] = None) -> str:
         summary_hint = ""
         if summary and not any(summary.startswith(prefix) for prefix in self.ERROR_PREFIXES) and not summary.strip().startswith("总结失败"):
             summary_hint = summary
@@ -196,14 +318,62 @@ class DocumentAIClient:
             "      要点\n"
             "```"
         )
-        return self._call_models(system_prompt, user_prompt, prefer_finance=False)
+        return self._call_models(system_prompt, user_prompt, prefer_finance=False, deadline=deadline)
+
+    def _section_ok(self, text) -> bool:
+        return isinstance(text, str) and not any(text.startswith(prefix) for prefix in self.ERROR_PREFIXES)
+
+    def generate_document_insights(
+        self,
+        text: str,
+        filename: str,
+        *,
+        deadline: Optional[Deadline] = None,
+        progress: Optional[Dict] = None,
+    ) -> Dict[str, str]:
+        """
+        依次生成总结、精读、翻译、导图。progress 保存已成功的部分结果并被原地更新；
+        遇到超时/取消抛出 DeadlineExceeded、遇到繁忙返回 {"_busy": True}，调用方可持久化 progress 供重试续跑。
+        """
+        if progress is None:
+            progress = {}
+        source_digest = hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+        if progress.get("_source") != source_digest:
+            progress.clear()
+            progress["_source"] = source_digest
 
-    def generate_document_insights(self, text: str, filename: str) -> Dict[str, str]:
         category = (self.categorize_document(filename, text) or "").strip()
-        summary = self.summarize_document(text, filename)
-        deep_read = self.deep_read_document(category, summary, text, filename)
-        translation = self.translate_document(summary, text, filename)
-        mindmap = self.mindmap_document(summary, text, filename)
+
+        def run_step(name: str, produce) -> str:
+            if name in progress:
+                return progress[name]
+            result = produce()
+            if self._section_ok(result) and not self.is_busy(result):
+                progress[name] = result
+            return result
+
+        summary = run_step("summary", lambda: self.summarize_document(text, filename, deadline=deadline))
+        if self.is_busy(summary):
+            return {"_busy": True}
+        # 任一步骤繁忙即返回，后续步骤同样会在队列里等满上限
+        deep_read = run_step(
+            "deep_read",
+            lambda: self.deep_read_document(category, summary, text, filename, deadline=deadline),
+        )
+        if self.is_busy(deep_read):
+            return {"_busy": True}
+        done_parts = progress.setdefault("translation_parts", [])
+        translation = run_step(
+            "translation",
+            lambda: self.translate_document(summary, text, filename, deadline=deadline, done_parts=done_parts),
+        )
+        if None in done_parts:
+            progress.pop("translation", None)
+        if self.is_busy(translation):
+            return {"_busy": True}
+        mindmap = run_step("mindmap", lambda: self.mindmap_document(summary, text, filename, deadline=deadline))
+        if self.is_busy(mindmap):
+            return {"_busy": True}
 
         if isinstance(summary, str):
             summary = summary.strip()
@@ -233,7 +403,14 @@ class DocumentAIClient:
         }
 
 
-    def ask_about_document(self, question: str, filename: str, document_excerpt: str) -> str:
+    def ask_about_document(
+        self,
+        question: str,
+        filename: str,
+        document_excerpt: str,
+        *,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
         system_prompt = (
             "你是一名专业的文件助手，将根据提供的文档内容回答用户的问题。"
             "若信息不足，请清楚说明。"
@@ -245,26 +422,107 @@ class DocumentAIClient:
             f"用户问题: {question}\n"
             "请用中文回答。"
         )
-        return self._request(system_prompt, user_prompt)
+        return self._request(system_prompt, user_prompt, priority=PRIORITY_INTERACTIVE, deadline=deadline)
+
+    def _cached_answer(self, key: str, produce) -> str:
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(key)
+            if cached is not None:
+                return cached
+
+        answer = produce()
+        if self.answer_cache is None or any(answer.startswith(prefix) for prefix in self.ERROR_PREFIXES):
+            return answer
+        self.answer_cache.put(key, answer)
+        return answer
+
+    def _answer_single_for_synthesis(
+        self,
+        question: str,
+        filename: str,
+        excerpt: str,
+        *,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        digest = hashlib.sha1(excerpt.encode("utf-8")).hexdigest()
+        key = f"{self.model}|{filename}|{digest}|{question}"
+        system_prompt = (
+            "你是一名文档分析助手，只根据给定文档摘录回答问题。"
+            "回答要简洁，保留关键数字和原文表述；若文档未涉及，请直接说明“未提及”。"
+        )
+        user_prompt = (
+            f"文件名: {filename}\n"
+            f"文档摘录(按相关度选取):\n{excerpt}\n"
+            f"用户问题: {question}\n"
+            "请用中文回答，控制在 300 字以内。"
+        )
+        return self._cached_answer(
+            key,
+            lambda: self._request(system_prompt, user_prompt, priority=PRIORITY_INTERACTIVE, deadline=deadline),
+        )
 
-    def ask_about_documents(
+    def ask_about_multiple_documents(
         self,
         question: str,
-        primary_filename: str,
-        primary_excerpt: str,
-        secondary_filename: str,
-        secondary_excerpt: str,
+        documents: List[Tuple[str, str]],
+        *,
+        deadline: Optional[Deadline] = None,
     ) -> str:
+        """
+        多文档问答：documents 为 (文件名, 文本) 列表。
+        按篇截取的摘录总量在预算内时一次调用直接回答；否则先并行逐篇作答（结果写入共享缓存），再合并综合。
+        """
+        if not documents:
+            return ""
+        if len(documents) == 1:
+            filename, text = documents[0]
+            return self.ask_about_document(question, filename, text, deadline=deadline)
+
+        labels = [chr(ord("A") + index) if index < 26 else str(index + 1) for index in range(len(documents))]
         system_prompt = (
-            "你是一名文档对比助手，需要结合两份文档回答问题。"
-            "回答中如涉及差异，请明确指出对应的文档。"
+            "你是一名多文档对比助手，需要结合多份文档回答问题。"
+            "回答中如涉及差异，请明确指出对应的文档编号和文件名。"
+        )
+
+        # 按篇均分预算截取摘录，能放进单次调用时直接回答
+        per_doc_budget = max(self.ask_char_budget // len(documents), self.ask_min_excerpt_chars)
+        excerpts = [
+            (filename, self._select_relevant_excerpt(text, question, max_chars=per_doc_budget))
+            for filename, text in documents
+        ]
+        if sum(len(excerpt) for _, excerpt in excerpts) <= self.ask_char_budget:
+            sections = "".join(
+                f"文档{label}: {filename}\n文档{label}摘录:\n{excerpt}\n"
+                for label, (filename, excerpt) in zip(labels, excerpts)
+            )
+            user_prompt = f"{sections}用户问题: {question}\n请用中文回答，必要时给出对比结论。"
+            return self._request(system_prompt, user_prompt, priority=PRIORITY_INTERACTIVE, deadline=deadline)
+
+        # 文档过多、均分后摘录过短时逐篇作答，每篇按单次调用的完整预算重新选取摘录
+        excerpts = [
+            (filename, self._select_relevant_excerpt(text, question, max_chars=self.ask_char_budget))
+            for filename, text in documents
+        ]
+        workers = max(1, min(self.ask_max_workers, len(excerpts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            answers = list(
+                executor.map(
+                    lambda item: self._answer_single_for_synthesis(question, item[0], item[1], deadline=deadline),
+                    excerpts,
+                )
+            )
+        if any(self.is_busy(answer) for answer in answers):
+            return self.BUSY_MESSAGE
+
+        answer_budget = max(self.ask_char_budget // len(answers), 200)
+        sections = "".join(
+            f"文档{label}: {filename}\n文档{label}单独回答:\n{answer[:answer_budget]}\n"
+            for label, (filename, _), answer in zip(labels, excerpts, answers)
         )
         user_prompt = (
-            f"文档A: {primary_filename}\n"
-            f"文档A摘录(截断):\n{primary_excerpt[:2500]}\n"
-            f"文档B: {secondary_filename}\n"
-            f"文档B摘录(截断):\n{secondary_excerpt[:2500]}\n"
+            f"{sections}"
             f"用户问题: {question}\n"
-            "请用中文回答，必要时给出对比结论。"
+            "以上是针对每份文档分别得到的回答，请综合为一份中文答复，指出共性与差异；"
+            "若某份文档回答失败或未提及，请如实说明。"
         )
-        return self._request(system_prompt, user_prompt)
+        return self._request(system_prompt, user_prompt, priority=PRIORITY_INTERACTIVE, deadline=deadline)
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover  Windows
+    fcntl = None
+
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".svg", ".json", ".html", ".txt", ".map"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _atomic_write(target: Path, data: bytes):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=str(target.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp_name, target)
+    except Exception:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+class AssetPipeline:
+    """
+    静态资源构建：为 static 下的文件生成带内容哈希的文件名，并预压缩 gzip / brotli 版本。
+    构建结果写入 dist_dir，manifest.json 记录 逻辑路径 -> 哈希路径 的映射。
+    部署时应先执行 `python -m services.asset_service` 作为构建步骤，应用启动只读取 manifest。
+    """
+
+    def __init__(self, static_dir: Path, dist_dir: Path):
+        self.static_dir = Path(static_dir)
+        self.dist_dir = Path(dist_dir)
+        self.manifest: Dict[str, str] = {}
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.dist_dir / "manifest.json"
+
+    def build(self) -> Dict[str, str]:
+        manifest: Dict[str, str] = {}
+        for source in sorted(self.static_dir.rglob("*")):
+            if not source.is_file() or source.name.startswith("."):
+                continue
+            logical = source.relative_to(self.static_dir).as_posix()
+            data = source.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = f"{Path(logical).with_suffix('').as_posix()}.{digest}{source.suffix}"
+            manifest[logical] = hashed
+
+            target = self.dist_dir / hashed
+            # 每个产物单独检查，构建中断后重跑能补齐缺失的压缩版本
+            if source.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+                gz_target = target.with_name(target.name + ".gz")
+                if not gz_target.exists():
+                    gz_data = gzip.compress(data, compresslevel=9, mtime=0)
+                    if len(gz_data) < len(data):
+                        _atomic_write(gz_target, gz_data)
+                br_target = target.with_name(target.name + ".br")
+                if brotli is not None and not br_target.exists():
+                    br_data = brotli.compress(data, quality=11)
+                    if len(br_data) < len(data):
+                        _atomic_write(br_target, br_data)
+            if not target.exists():
+                _atomic_write(target, data)
+
+        _atomic_write(self.manifest_path, json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        self.manifest = manifest
+        return manifest
+
+    def is_stale(self) -> bool:
+        """manifest 缺失或早于任一源文件时需要重新构建"""
+        try:
+            built_at = self.manifest_path.stat().st_mtime
+        except OSError:
+            return True
+        for source in self.static_dir.rglob("*"):
+            if source.is_file() and not source.name.startswith(".") and source.stat().st_mtime > built_at:
+                return True
+        return False
+
+    def load_or_build(self) -> Dict[str, str]:
+        """
+        读取已构建的 manifest；缺失或过期时（开发环境未执行构建步骤）才在文件锁内构建，
+        多个 worker 同时启动时只有一个真正构建，其余等待后直接读取结果。
+        """
+        if not self.is_stale() and self.load():
+            return self.manifest
+        self.dist_dir.mkdir(parents=True, exist_ok=True)
+        with (self.dist_dir / ".build.lock").open("w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not self.is_stale() and self.load():
+                    return self.manifest
+                return self.build()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self) -> Dict[str, str]:
+        try:
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            self.manifest = {}
+        return self.manifest
+
+    def hashed_name(self, logical: str) -> Optional[str]:
+        return self.manifest.get(logical)
+
+    def pick_variant(self, hashed: str, accept_encodings) -> tuple[Path, Optional[str]]:
+        """按 Accept-Encoding 选择预压缩版本，返回 (文件路径, Content-Encoding)"""
+        target = self.dist_dir / hashed
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            # 按 q 值判断，"gzip;q=0" 表示明确拒绝
+            if not accept_encodings[encoding] > 0:
+                continue
+            candidate = target.with_name(target.name + suffix)
+            if candidate.exists():
+                return candidate, encoding
+        return target, None
+
+    @staticmethod
+    def guess_mimetype(hashed: str) -> str:
+        return mimetypes.guess_type(hashed)[0] or "application/octet-stream"
+
+
+if __name__ == "__main__":
+    base_dir = Path(__file__).resolve().parent.parent
+    result = AssetPipeline(base_dir / "static", base_dir / "build" / "static").build()
+    print(f"已生成 {len(result)} 个静态资源")
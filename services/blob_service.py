@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# 体积较大的分析结果单独压缩存放，元数据里只保留引用
+BLOB_SECTIONS = ("deep_read", "translation", "mindmap")
+
+
+class BlobStore:
+    """按内容哈希寻址的压缩文本存储，优先使用 zstd，未安装时退回 gzip"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _candidates(self, ref: str) -> List[Path]:
+        folder = self.root / ref[:2]
+        return [folder / f"{ref}.zst", folder / f"{ref}.gz"]
+
+    def put_text(self, text: str) -> str:
+        data = (text or "").encode("utf-8")
+        ref = hashlib.sha256(data).hexdigest()
+        if any(path.exists() for path in self._candidates(ref)):
+            return ref
+
+        if zstandard is not None:
+            target = self._candidates(ref)[0]
+            payload = zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            target = self._candidates(ref)[1]
+            payload = gzip.compress(data, compresslevel=6, mtime=0)
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=str(target.parent), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(payload)
+            os.replace(tmp_name, target)
+        except Exception:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return ref
+
+    def get_text(self, ref: str) -> Optional[str]:
+        zst_path, gz_path = self._candidates(ref)
+        try:
+            if zst_path.exists() and zstandard is not None:
+                with zst_path.open("rb") as fp:
+                    return zstandard.ZstdDecompressor().stream_reader(fp).read().decode("utf-8")
+            if gz_path.exists():
+                with gzip.open(gz_path, "rb") as fp:
+                    return fp.read().decode("utf-8")
+        except (OSError, EOFError, ValueError):
+            return None
+        return None
+
+    def delete(self, ref: str):
+        for path in self._candidates(ref):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError:
+                pass
+
+
+def externalize_analysis(store: BlobStore, analysis: Dict) -> Dict:
+    """把分析结果中的大字段写入 BlobStore，返回只含引用的精简记录"""
+    if not analysis:
+        return analysis
+    compact = {key: value for key, value in analysis.items() if key not in BLOB_SECTIONS}
+    blobs = dict(analysis.get("_blobs") or {})
+    for section in BLOB_SECTIONS:
+        if section in analysis:
+            blobs[section] = store.put_text(analysis[section] or "")
+    if blobs:
+        compact["_blobs"] = blobs
+    return compact
+
+
+def needs_externalize(analysis: Optional[Dict]) -> bool:
+    return bool(analysis) and any(section in analysis for section in BLOB_SECTIONS)
+
+
+def externalize_documents(store: BlobStore, documents: List[Dict]) -> int:
+    """把仍内联保存大字段的旧记录原地迁移为引用，返回迁移的文档数"""
+    migrated = 0
+    for document in documents:
+        if needs_externalize(document.get("analysis")):
+            document["analysis"] = externalize_analysis(store, document["analysis"])
+            migrated += 1
+    return migrated
+
+
+def analysis_sections(analysis: Optional[Dict]) -> Set[str]:
+    if not analysis:
+        return set()
+    return (set(analysis.keys()) | set((analysis.get("_blobs") or {}).keys())) - {"_blobs"}
+
+
+def hydrate_analysis(store: BlobStore, analysis: Dict, sections: Optional[Iterable[str]] = None) -> Dict:
+    """还原分析结果；sections 指定时只解压请求的字段"""
+    wanted = set(sections) if sections is not None else set(BLOB_SECTIONS)
+    result = {key: value for key, value in (analysis or {}).items() if key != "_blobs"}
+    for section, ref in ((analysis or {}).get("_blobs") or {}).items():
+        if section in wanted:
+            result[section] = store.get_text(ref) or ""
+    if sections is not None:
+        result = {
+            key: value
+            for key, value in result.items()
+            if key in wanted or key not in BLOB_SECTIONS
+        }
+    return result
+
+
+def collect_blob_refs(document: Dict) -> Set[str]:
+    refs = set(((document.get("analysis") or {}).get("_blobs") or {}).values())
+    if document.get("text_blob"):
+        refs.add(document["text_blob"])
+    if document.get("analysis_progress"):
+        refs.add(document["analysis_progress"])
+    return refs
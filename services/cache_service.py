@@ -0,0 +1,61 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class AnswerCache:
+    """多进程共享的问答中间结果缓存（本地 SQLite），按最近使用时间淘汰"""
+
+    def __init__(self, db_path: Path, *, max_entries: int = 2000):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    used_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_used ON answer_cache (used_at)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT answer FROM answer_cache WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE answer_cache SET used_at = ? WHERE cache_key = ?", (time.time(), key))
+            return row[0]
+        finally:
+            conn.close()
+
+    def put(self, key: str, answer: str):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO answer_cache (cache_key, answer, used_at) VALUES (?, ?, ?)",
+                (key, answer, time.time()),
+            )
+            conn.execute(
+                """
+                DELETE FROM answer_cache WHERE cache_key IN (
+                    SELECT cache_key FROM answer_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+        finally:
+            conn.close()
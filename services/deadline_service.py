@@ -0,0 +1,97 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+
+class DeadlineExceeded(Exception):
+    """请求超出时间预算，或已被客户端取消"""
+
+
+class Deadline:
+    """请求级时间预算，沿调用链传递；cancel_check 返回 True 表示客户端已放弃该请求"""
+
+    def __init__(self, budget_seconds: Optional[float] = None, *, cancel_check: Optional[Callable[[], bool]] = None):
+        self.expires_at = time.monotonic() + budget_seconds if budget_seconds else None
+        self.cancel_check = cancel_check
+        self.cancelled = False
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            return True
+        if not self.cancelled and self.cancel_check is not None:
+            try:
+                self.cancelled = bool(self.cancel_check())
+            except Exception:  # pylint: disable=broad-except
+                self.cancelled = False
+        return self.cancelled
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("请求已取消" if self.cancelled else "请求超出时间预算")
+
+    def timeout(self, default: float) -> float:
+        """网络调用的超时时间，不超过剩余预算"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(min(default, remaining), 0.1)
+
+
+def check_deadline(deadline: Optional[Deadline]):
+    if deadline is not None:
+        deadline.check()
+
+
+class CancellationRegistry:
+    """跨进程的请求取消标记，与调度器共用本地 SQLite 文件"""
+
+    def __init__(self, db_path: Path, *, ttl_seconds: float = 3600.0):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cancelled_requests (request_id TEXT PRIMARY KEY, created_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def cancel(self, request_id: str):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM cancelled_requests WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "INSERT OR REPLACE INTO cancelled_requests (request_id, created_at) VALUES (?, ?)",
+                (request_id, now),
+            )
+        finally:
+            conn.close()
+
+    def is_cancelled(self, request_id: str) -> bool:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT 1 FROM cancelled_requests WHERE request_id = ?",
+                (request_id,),
+            ).fetchone()
+            return row is not None
+        finally:
+            conn.close()
+
+    def deadline_for(self, request_id: Optional[str], budget_seconds: Optional[float]) -> Deadline:
+        if not request_id:
+            return Deadline(budget_seconds)
+        return Deadline(budget_seconds, cancel_check=lambda: self.is_cancelled(request_id))
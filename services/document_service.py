@@ -1,16 +1,21 @@
 import json
+import os
+import tempfile
 import uuid
 import mimetypes
 import socket
 import ipaddress
 from urllib.parse import urlparse, unquote
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 import requests
 from werkzeug.utils import secure_filename
 
+from .deadline_service import Deadline, DeadlineExceeded
 from .ocr_service import extract_image_text
+from .ooxml_service import extract_docx_text, extract_pptx_text
+from .storage_service import new_storage_key, temp_download_path
 
 
 def load_documents(data_file: Path) -> List[Dict]:
@@ -24,25 +29,28 @@ def load_documents(data_file: Path) -> List[Dict]:
 
 
 def store_documents(data_file: Path, documents: List[Dict]):
+    """先写临时文件再原子替换，其他进程读取时不会看到被截断的半个文件"""
     data_file.parent.mkdir(parents=True, exist_ok=True)
-    with data_file.open("w", encoding="utf-8") as fp:
-        json.dump(documents, fp, ensure_ascii=False, indent=2)
+    fd, tmp_name = tempfile.mkstemp(dir=str(data_file.parent), prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            json.dump(documents, fp, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_name, data_file)
+    except Exception:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
 
 
-def save_uploaded_file(file, upload_dir: Path) -> Tuple[Path, str]:
-    upload_dir.mkdir(parents=True, exist_ok=True)
+def save_uploaded_file(file, storage) -> Tuple[str, str]:
+    """保存上传文件，返回 (存储 key, 原始文件名)"""
     original_name = file.filename
     filename = secure_filename(original_name)
     if not filename:
         filename = uuid.uuid4().hex
-    target = upload_dir / filename
-    counter = 1
-    while target.exists():
-        stem = target.stem.split("__")[0]
-        target = upload_dir / f"{stem}__{counter}{target.suffix}"
-        counter += 1
-    file.save(target)
-    return target, original_name
+    key = new_storage_key(filename)
+    storage.save_fileobj(key, file.stream)
+    return key, original_name
 
 
 def _is_public_ip(hostname: str) -> bool:
@@ -93,7 +101,7 @@ def _pick_filename_from_url(url: str, content_type) -> str:
     return f"{uuid.uuid4().hex}.bin"
 
 
-def download_file_from_url(url: str, upload_dir: Path, *, max_bytes: int = 64 * 1024 * 1024) -> Tuple[Path, str]:
+def download_file_from_url(url: str, storage, *, max_bytes: int = 64 * 1024 * 1024) -> Tuple[str, str]:
     parsed = urlparse(url)
     if parsed.scheme not in {"http", "https"}:
         raise ValueError("仅支持 http/https 链接")
@@ -104,8 +112,6 @@ def download_file_from_url(url: str, upload_dir: Path, *, max_bytes: int = 64 *
     if not _is_public_ip(parsed.hostname or ""):
         raise ValueError("出于安全考虑，禁止访问内网/本机地址")
 
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
     session = requests.Session()
     current_url = url
     response = None
@@ -154,12 +160,7 @@ def download_file_from_url(url: str, upload_dir: Path, *, max_bytes: int = 64 *
     }
     if Path(filename).suffix.lower() not in allowed_suffixes:
         raise ValueError("暂不支持该链接文件类型，请提供 PDF/DOCX/PPTX/图片/TXT 等格式")
-    target = upload_dir / filename
-    counter = 1
-    while target.exists():
-        stem = target.stem.split("__")[0]
-        target = upload_dir / f"{stem}__{counter}{target.suffix}"
-        counter += 1
+    target = temp_download_path(Path(filename).suffix)
 
     total = 0
     try:
@@ -179,12 +180,19 @@ def download_file_from_url(url: str, upload_dir: Path, *, max_bytes: int = 64 *
                 pass
         raise
 
+    key = new_storage_key(filename)
+    storage.put_file(key, target)
     original_name = Path(unquote(urlparse(current_url).path)).name or filename
-    return target, original_name
+    return key, original_name
 
 
-def extract_preview_text(file_path: Path) -> str:
-    """提取用于 AI 分析的简短文本摘要"""
+def extract_preview_text(
+    file_path: Path,
+    *,
+    ocr_path: Optional[Path] = None,
+    deadline: Optional[Deadline] = None,
+) -> str:
+    """提取用于 AI 分析的简短文本摘要；图片可传入预处理后的 ocr_path 以减小 OCR 开销"""
     suffix = file_path.suffix.lower()
     try:
         if suffix in {".txt", ".md", ".csv", ".json"}:
@@ -198,16 +206,20 @@ def extract_preview_text(file_path: Path) -> str:
                 pages_text.append(page.extract_text() or "")
             return "\n".join(pages_text)
         if suffix in {".docx"}:
-            from docx import Document  # type: ignore
-
-            document = Document(str(file_path))
-            paragraphs = [p.text for p in document.paragraphs if p.text.strip()]
-            return "\n".join(paragraphs[:100])
+            return extract_docx_text(file_path, max_chars=12000)
+        if suffix in {".pptx"}:
+            return extract_pptx_text(file_path, max_chars=12000)
         if suffix in {".png", ".jpg", ".jpeg", ".gif", ".webp"}:
-            ocr_text = extract_image_text(file_path).strip()
+            ocr_text = extract_image_text(
+                ocr_path or file_path,
+                display_name=file_path.name,
+                deadline=deadline,
+            ).strip()
             if ocr_text:
                 return ocr_text
             return f"图片文件: {file_path.name}"
+    except DeadlineExceeded:
+        raise
     except Exception:  # pylint: disable=broad-except
         return ""
     return ""
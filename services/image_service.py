@@ -0,0 +1,122 @@
+import io
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    from PIL import Image, ImageOps  # type: ignore
+except ImportError:  # pragma: no cover
+    Image = None
+    ImageOps = None
+
+try:
+    import pillow_avif  # type: ignore  # noqa: F401  旧版 Pillow 通过插件支持 AVIF
+except ImportError:  # pragma: no cover
+    pillow_avif = None
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+DISPLAY_WIDTHS = (480, 960, 1600)
+OCR_MAX_SIDE = 2400
+EXIF_ORIENTATION = 0x0112
+
+
+def _supported_formats() -> List[str]:
+    Image.init()
+    formats = ["webp"] if "WEBP" in Image.SAVE else []
+    if "AVIF" in Image.SAVE:
+        formats.append("avif")
+    return formats
+
+
+def _encode(image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, format="WEBP", quality=80, method=4)
+    elif fmt == "avif":
+        image.save(buffer, format="AVIF", quality=60)
+    else:
+        image.save(buffer, format="JPEG", quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def _store(storage, key: str, data: bytes):
+    storage.save_fileobj(key, io.BytesIO(data))
+
+
+def ingest_image(storage, key: str) -> Optional[Dict]:
+    """
+    读取图片的 EXIF 方向与尺寸，生成多档 WebP/AVIF 展示图及 OCR 用灰度图并写入存储。
+    返回写入文档记录的 image 字段；Pillow 不可用或图片无法解析时返回 None。
+    """
+    if Image is None:
+        return None
+
+    source = storage.local_path(key)
+    variant_prefix = f"variants/{key}"
+    try:
+        with Image.open(str(source)) as original:
+            orientation = int(original.getexif().get(EXIF_ORIENTATION, 1) or 1)
+            animated = bool(getattr(original, "is_animated", False))
+            width, height = original.size
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            # JPEG 直接按所需分辨率解码，避免把大照片完整解码到内存
+            if original.format == "JPEG":
+                scale = min(1.0, max(OCR_MAX_SIDE / max(width, height), DISPLAY_WIDTHS[-1] / width))
+                original.draft("RGB", (int(original.size[0] * scale), int(original.size[1] * scale)))
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in {"RGB", "RGBA", "L"}:
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+            ocr_image = ImageOps.autocontrast(image.convert("L"))
+            ocr_image.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.LANCZOS)
+            ocr_key = f"{variant_prefix}/ocr.jpg"
+            _store(storage, ocr_key, _encode(ocr_image, "jpeg"))
+            del ocr_image
+
+            variants: List[Dict] = []
+            # 动图保留原文件展示，避免只剩第一帧
+            formats = [] if animated else _supported_formats()
+            target_widths = [target for target in DISPLAY_WIDTHS if target < width] or [width]
+            # 从大到小逐级缩放，每档基于上一档生成，不再为每个宽度复制一份原图
+            current = image
+            for target_width in sorted(target_widths, reverse=True) if formats else ():
+                target_width = min(target_width, current.width)
+                target_height = max(1, round(current.height * target_width / current.width))
+                resized = current.resize((target_width, target_height), Image.LANCZOS, reducing_gap=3.0)
+                for fmt in formats:
+                    data = _encode(resized, fmt)
+                    variant_key = f"{variant_prefix}/w{resized.width}.{fmt}"
+                    _store(storage, variant_key, data)
+                    variants.append(
+                        {
+                            "key": variant_key,
+                            "format": fmt,
+                            "width": resized.width,
+                            "height": resized.height,
+                            "size": len(data),
+                        }
+                    )
+                current = resized
+            variants.sort(key=lambda variant: variant["width"])
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    return {
+        "width": width,
+        "height": height,
+        "orientation": orientation,
+        "variants": variants,
+        "ocr_variant": ocr_key,
+    }
+
+
+def image_variant_keys(document: Dict) -> List[str]:
+    info = document.get("image") or {}
+    keys = [variant["key"] for variant in info.get("variants") or []]
+    if info.get("ocr_variant"):
+        keys.append(info["ocr_variant"])
+    return keys
+
+
+def is_image_key(key: str) -> bool:
+    return Path(key).suffix.lower() in IMAGE_SUFFIXES
@@ -5,12 +5,14 @@ from typing import Optional
 
 import requests
 
+from .deadline_service import Deadline, check_deadline
+
 DEFAULT_BAIDU_OCR_KEY = (
     "bce-v3/ALTAK-xFMZoXtvAUOk6XgTe9hxr/930e05f6f6184d73cd9409c35de1756968702639"
 )
 
 
-def call_baidu_ocr(image_path: Path) -> Optional[str]:
+def call_baidu_ocr(image_path: Path, *, timeout: float = 15) -> Optional[str]:
     """调用百度 OCR 接口，若失败返回 None。"""
     api_key = os.getenv("BAIDU_OCR_API_KEY") or DEFAULT_BAIDU_OCR_KEY
     if not api_key:
@@ -25,7 +27,7 @@ def call_baidu_ocr(image_path: Path) -> Optional[str]:
             "Authorization": f"Bearer {api_key}",
         }
         api_url = "https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic"
-        resp = requests.post(api_url, headers=headers, data={"image": image_base64}, timeout=15)
+        resp = requests.post(api_url, headers=headers, data={"image": image_base64}, timeout=timeout)
         resp.raise_for_status()
         data = resp.json()
         if "words_result" in data:
@@ -35,23 +37,30 @@ def call_baidu_ocr(image_path: Path) -> Optional[str]:
     return None
 
 
-def basic_pillow_extract(image_path: Path) -> str:
+def basic_pillow_extract(image_path: Path, *, timeout: float = 0) -> str:
     try:
         from PIL import Image  # type: ignore
         import pytesseract  # type: ignore
 
-        text = pytesseract.image_to_string(Image.open(str(image_path)), lang="chi_sim+eng")
+        text = pytesseract.image_to_string(Image.open(str(image_path)), lang="chi_sim+eng", timeout=timeout)
         return text.strip()
     except Exception:
         return ""
 
 
-def extract_image_text(image_path: Path) -> str:
-    text = call_baidu_ocr(image_path)
+def extract_image_text(
+    image_path: Path,
+    *,
+    display_name: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
+) -> str:
+    check_deadline(deadline)
+    text = call_baidu_ocr(image_path, timeout=deadline.timeout(15) if deadline else 15)
     if text:
         return text
-    fallback = basic_pillow_extract(image_path)
+    check_deadline(deadline)
+    fallback = basic_pillow_extract(image_path, timeout=deadline.timeout(60) if deadline else 0)
     if fallback:
         return fallback
     # 兜底信息
-    return f"图片文件: {image_path.name}"
+    return f"图片文件: {display_name or image_path.name}"
@@ -0,0 +1,176 @@
+import posixpath
+import re
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+from xml.etree.ElementTree import ParseError, iterparse
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+NOTES_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/notesSlide"
+
+
+def _take(lines: Iterable[str], max_chars: int) -> str:
+    """按字符预算收集文本行，预算用尽立即停止读取"""
+    collected: List[str] = []
+    used = 0
+    for line in lines:
+        if used + len(line) >= max_chars:
+            remainder = line[: max(max_chars - used, 0)]
+            if remainder:
+                collected.append(remainder)
+            break
+        collected.append(line)
+        used += len(line) + 1
+    return "\n".join(collected)
+
+
+def _iter_docx_lines(stream) -> Iterator[str]:
+    buffer: List[str] = []
+    row_stack: List[List[str]] = []
+    cell_stack: List[List[str]] = []
+
+    for event, elem in iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == f"{W_NS}tr":
+                row_stack.append([])
+            elif tag == f"{W_NS}tc":
+                cell_stack.append([])
+            continue
+
+        if tag == f"{W_NS}t":
+            buffer.append(elem.text or "")
+        elif tag == f"{W_NS}tab":
+            buffer.append("\t")
+        elif tag in (f"{W_NS}br", f"{W_NS}cr"):
+            buffer.append("\n")
+        elif tag == f"{W_NS}p":
+            text = "".join(buffer).strip()
+            buffer = []
+            elem.clear()
+            if not text:
+                continue
+            if cell_stack:
+                cell_stack[-1].append(text)
+            else:
+                yield text
+        elif tag == f"{W_NS}tc" and cell_stack:
+            cell = " ".join(cell_stack.pop())
+            if row_stack:
+                row_stack[-1].append(cell)
+        elif tag == f"{W_NS}tr" and row_stack:
+            cells = row_stack.pop()
+            elem.clear()
+            if not any(cells):
+                continue
+            row = " | ".join(cells)
+            if cell_stack:
+                cell_stack[-1].append(row)
+            else:
+                yield row
+
+
+def extract_docx_text(file_path: Path, *, max_chars: int = 12000) -> str:
+    """流式解析 word/document.xml，正文与表格按出现顺序输出；不会读取内嵌图片等媒体"""
+    with zipfile.ZipFile(str(file_path)) as archive:
+        with archive.open("word/document.xml") as stream:
+            return _take(_iter_docx_lines(stream), max_chars)
+
+
+def _iter_drawing_lines(stream) -> Iterator[str]:
+    buffer: List[str] = []
+    field_depth = 0
+    for event, elem in iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if tag == f"{A_NS}fld":
+            # 页码、日期等字段不属于正文
+            field_depth += 1 if event == "start" else -1
+            continue
+        if event == "start":
+            continue
+        if tag == f"{A_NS}t" and not field_depth:
+            buffer.append(elem.text or "")
+        elif tag == f"{A_NS}br":
+            buffer.append("\n")
+        elif tag == f"{A_NS}p":
+            text = "".join(buffer).strip()
+            buffer = []
+            elem.clear()
+            if text:
+                yield text
+
+
+def _read_rels(archive: zipfile.ZipFile, part: str) -> dict:
+    folder, name = posixpath.split(part)
+    rels_name = posixpath.join(folder, "_rels", f"{name}.rels")
+    rels = {}
+    try:
+        with archive.open(rels_name) as stream:
+            for _, elem in iterparse(stream):
+                if elem.tag == f"{PKG_REL_NS}Relationship":
+                    target = posixpath.normpath(posixpath.join(folder, elem.get("Target", "")))
+                    rels[elem.get("Id")] = (elem.get("Type", ""), target)
+    except (KeyError, ParseError):
+        return {}
+    return rels
+
+
+def _slide_parts(archive: zipfile.ZipFile) -> List[str]:
+    rels = _read_rels(archive, "ppt/presentation.xml")
+    ordered: List[str] = []
+    try:
+        with archive.open("ppt/presentation.xml") as stream:
+            for _, elem in iterparse(stream):
+                if elem.tag == f"{P_NS}sldId":
+                    rel = rels.get(elem.get(f"{R_NS}id"))
+                    if rel:
+                        ordered.append(rel[1])
+    except (KeyError, ParseError):
+        ordered = []
+
+    names = set(archive.namelist())
+    ordered = [part for part in ordered if part in names]
+    if ordered:
+        return ordered
+
+    def slide_number(name: str) -> int:
+        match = re.search(r"slide(\d+)\.xml$", name)
+        return int(match.group(1)) if match else 0
+
+    return sorted((name for name in names if re.match(r"ppt/slides/slide\d+\.xml$", name)), key=slide_number)
+
+
+def _iter_pptx_lines(archive: zipfile.ZipFile, *, include_notes: bool) -> Iterator[str]:
+    for index, part in enumerate(_slide_parts(archive), start=1):
+        yield f"[幻灯片 {index}]"
+        with archive.open(part) as stream:
+            yield from _iter_drawing_lines(stream)
+
+        if not include_notes:
+            continue
+        notes_part: Optional[str] = None
+        for rel_type, target in _read_rels(archive, part).values():
+            if rel_type == NOTES_REL_TYPE:
+                notes_part = target
+                break
+        if not notes_part:
+            continue
+        try:
+            with archive.open(notes_part) as stream:
+                notes = list(_iter_drawing_lines(stream))
+        except KeyError:
+            continue
+        if notes:
+            yield "[备注]"
+            yield from notes
+
+
+def extract_pptx_text(file_path: Path, *, max_chars: int = 12000, include_notes: bool = True) -> str:
+    """按放映顺序流式提取幻灯片文字及备注，预算用尽即停止"""
+    with zipfile.ZipFile(str(file_path)) as archive:
+        return _take(_iter_pptx_lines(archive, include_notes=include_notes), max_chars)
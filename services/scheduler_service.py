@@ -0,0 +1,316 @@
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# 排队记录超过自身优先级的等待上限再加这段宽限即视为遗留
+STALE_GRACE_SECONDS = 5.0
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":  # pragma: no cover  Windows 上 os.kill 会直接结束进程
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _parse_rate_limits(raw: str) -> Dict[str, float]:
+    """解析 "model-a=60,model-b=30" 形式的每分钟限额配置"""
+    limits: Dict[str, float] = {}
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if not name or not value.strip():
+            continue
+        try:
+            limits[name] = float(value)
+        except ValueError:
+            continue
+    return limits
+
+
+class ModelCallScheduler:
+    """
+    基于本地 SQLite 的跨进程模型调用准入控制。
+    每个模型一个令牌桶；等待队列按优先级 + 入队时间排序，交互式问答优先于后台分析。
+    队列过长或等待超时直接返回 False，由调用方给出“繁忙”提示，而不是堆积超时请求。
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        *,
+        rate_per_minute: float = 60.0,
+        burst: float = 10.0,
+        model_rates: Optional[Dict[str, float]] = None,
+        max_queue: Optional[Dict[int, int]] = None,
+        max_wait: Optional[Dict[int, float]] = None,
+        poll_interval: float = 0.1,
+    ):
+        self.db_path = Path(db_path)
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.model_rates = model_rates or {}
+        self.max_queue = max_queue or {PRIORITY_INTERACTIVE: 20, PRIORITY_BACKGROUND: 10}
+        self.max_wait = max_wait or {PRIORITY_INTERACTIVE: 8.0, PRIORITY_BACKGROUND: 60.0}
+        self.poll_interval = poll_interval
+        self._init_db()
+
+    @classmethod
+    def from_env(cls, db_path: Path) -> "ModelCallScheduler":
+        return cls(
+            db_path,
+            rate_per_minute=float(os.getenv("DASHSCOPE_RATE_PER_MINUTE", "60")),
+            burst=float(os.getenv("DASHSCOPE_RATE_BURST", "10")),
+            model_rates=_parse_rate_limits(os.getenv("DASHSCOPE_MODEL_RATES", "")),
+            max_queue={
+                PRIORITY_INTERACTIVE: int(os.getenv("DASHSCOPE_MAX_QUEUE_INTERACTIVE", "20")),
+                PRIORITY_BACKGROUND: int(os.getenv("DASHSCOPE_MAX_QUEUE_BACKGROUND", "10")),
+            },
+            max_wait={
+                PRIORITY_INTERACTIVE: float(os.getenv("DASHSCOPE_MAX_WAIT_INTERACTIVE", "8")),
+                PRIORITY_BACKGROUND: float(os.getenv("DASHSCOPE_MAX_WAIT_BACKGROUND", "60")),
+            },
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    model TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS waiters (
+                    ticket TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    pid INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_waiters_model
+                    ON waiters (model, priority, enqueued_at);
+                CREATE TABLE IF NOT EXISTS counters (
+                    model TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    granted INTEGER NOT NULL DEFAULT 0,
+                    rejected INTEGER NOT NULL DEFAULT 0,
+                    wait_ms REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (model, priority)
+                );
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(waiters)")}
+            if "pid" not in columns:
+                conn.execute("ALTER TABLE waiters ADD COLUMN pid INTEGER")
+        finally:
+            conn.close()
+
+    def _rate_for(self, model: str) -> float:
+        return self.model_rates.get(model, self.rate_per_minute)
+
+    def _bump(self, conn: sqlite3.Connection, model: str, priority: int, *, granted: int = 0, rejected: int = 0, wait_ms: float = 0.0):
+        conn.execute(
+            """
+            INSERT INTO counters (model, priority, granted, rejected, wait_ms) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (model, priority) DO UPDATE SET
+                granted = granted + excluded.granted,
+                rejected = rejected + excluded.rejected,
+                wait_ms = wait_ms + excluded.wait_ms
+            """,
+            (model, priority, granted, rejected, wait_ms),
+        )
+
+    def _purge_stale(self, conn: sqlite3.Connection, now: float, model: str):
+        """
+        清理被强制结束（SIGKILL、gunicorn 超时）的进程遗留的排队记录：
+        所属进程已不存在，或已超过该优先级的等待上限。
+        """
+        for priority, max_wait in self.max_wait.items():
+            conn.execute(
+                "DELETE FROM waiters WHERE priority = ? AND enqueued_at < ?",
+                (priority, now - max_wait - STALE_GRACE_SECONDS),
+            )
+        conn.execute(
+            "DELETE FROM waiters WHERE enqueued_at < ?",
+            (now - max(self.max_wait.values(), default=0.0) - STALE_GRACE_SECONDS,),
+        )
+        own_pid = os.getpid()
+        pids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT pid FROM waiters WHERE model = ? AND pid IS NOT NULL AND pid != ?",
+                (model, own_pid),
+            )
+        ]
+        for pid in pids:
+            if not _pid_alive(pid):
+                conn.execute("DELETE FROM waiters WHERE pid = ?", (pid,))
+
+    def _enqueue(self, conn: sqlite3.Connection, ticket: str, model: str, priority: int) -> Optional[float]:
+        """登记排队；成功返回入队时间，队列已满返回 None"""
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._purge_stale(conn, now, model)
+            depth = conn.execute(
+                "SELECT COUNT(*) FROM waiters WHERE model = ? AND priority = ?",
+                (model, priority),
+            ).fetchone()[0]
+            if depth >= self.max_queue.get(priority, 0):
+                self._bump(conn, model, priority, rejected=1)
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "INSERT INTO waiters (ticket, model, priority, enqueued_at, pid) VALUES (?, ?, ?, ?, ?)",
+                (ticket, model, priority, now, os.getpid()),
+            )
+            conn.execute("COMMIT")
+            return now
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _try_take(self, conn: sqlite3.Connection, ticket: str, model: str, priority: int, enqueued_at: float) -> float:
+        """尝试获取令牌；成功返回 0，否则返回建议的等待秒数"""
+        now = time.time()
+        rate = self._rate_for(model)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ahead_sql = """
+                SELECT COUNT(*) FROM waiters
+                WHERE model = ? AND ticket != ?
+                  AND (priority < ? OR (priority = ? AND enqueued_at < ?))
+            """
+            ahead_args = (model, ticket, priority, priority, enqueued_at)
+            ahead = conn.execute(ahead_sql, ahead_args).fetchone()[0]
+            if ahead:
+                self._purge_stale(conn, now, model)
+                ahead = conn.execute(ahead_sql, ahead_args).fetchone()[0]
+
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE model = ?", (model,)).fetchone()
+            tokens = self.burst if row is None else row[0]
+            if row is not None and rate > 0:
+                tokens = min(self.burst, tokens + (now - row[1]) * rate / 60.0)
+
+            if ahead == 0 and tokens >= 1:
+                tokens -= 1
+                conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+                self._bump(conn, model, priority, granted=1, wait_ms=(now - enqueued_at) * 1000)
+                wait = 0.0
+            else:
+                wait = self.poll_interval
+                if ahead == 0 and rate > 0:
+                    wait = max(self.poll_interval, (1 - tokens) * 60.0 / rate)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (model, tokens, updated_at) VALUES (?, ?, ?)",
+                (model, tokens, now),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, model: str, priority: int = PRIORITY_BACKGROUND, *, timeout: Optional[float] = None) -> bool:
+        """排队等待调用 model 的许可；队列已满或超过等待上限时返回 False"""
+        ticket = uuid.uuid4().hex
+        max_wait = self.max_wait.get(priority, 0.0)
+        if timeout is not None:
+            max_wait = min(max_wait, timeout)
+
+        conn = self._connect()
+        enqueued_at = None
+        granted = False
+        try:
+            enqueued_at = self._enqueue(conn, ticket, model, priority)
+            if enqueued_at is None:
+                return False
+            deadline = enqueued_at + max_wait
+            while True:
+                wait = self._try_take(conn, ticket, model, priority, enqueued_at)
+                if wait == 0:
+                    granted = True
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                time.sleep(min(wait, remaining, 1.0))
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+            self._bump(conn, model, priority, rejected=1)
+            conn.execute("COMMIT")
+            return False
+        finally:
+            # 任何异常（数据库错误、SystemExit 等）都要撤下排队票据，否则后续请求会一直被判为繁忙
+            if enqueued_at is not None and not granted:
+                try:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+                except sqlite3.Error:
+                    pass
+            conn.close()
+
+    def metrics(self) -> Dict:
+        conn = self._connect()
+        try:
+            models: Dict[str, Dict] = {}
+
+            def entry(model: str) -> Dict:
+                return models.setdefault(
+                    model,
+                    {
+                        "tokens": None,
+                        "rate_per_minute": self._rate_for(model),
+                        "queues": {
+                            name: {"depth": 0, "granted": 0, "rejected": 0, "avg_wait_ms": 0.0}
+                            for name in PRIORITY_NAMES.values()
+                        },
+                    },
+                )
+
+            for model, tokens in conn.execute("SELECT model, tokens FROM buckets"):
+                entry(model)["tokens"] = round(tokens, 2)
+            for model, priority, depth in conn.execute(
+                "SELECT model, priority, COUNT(*) FROM waiters GROUP BY model, priority"
+            ):
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                entry(model)["queues"].setdefault(name, {})["depth"] = depth
+            for model, priority, granted, rejected, wait_ms in conn.execute(
+                "SELECT model, priority, granted, rejected, wait_ms FROM counters"
+            ):
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                queue = entry(model)["queues"].setdefault(name, {"depth": 0})
+                queue["granted"] = granted
+                queue["rejected"] = rejected
+                queue["avg_wait_ms"] = round(wait_ms / granted, 1) if granted else 0.0
+            return {"models": models}
+        finally:
+            conn.close()
@@ -0,0 +1,301 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from werkzeug.security import safe_join
+
+try:
+    import boto3  # type: ignore
+    from botocore.exceptions import ClientError  # type: ignore
+except ImportError:  # pragma: no cover
+    boto3 = None
+    ClientError = Exception
+
+
+def new_storage_key(filename: str) -> str:
+    """为上传文件生成不会冲突的 key：随机前缀 + 安全文件名，多节点并发写入也无需先查询是否存在"""
+    return f"{uuid.uuid4().hex}_{filename}"
+
+
+class LocalStorage:
+    """本地目录存储，key 为相对 root 的路径"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        joined = safe_join(str(self.root), key)
+        if joined is None:
+            raise FileNotFoundError(key)
+        return Path(joined)
+
+    def exists(self, key: str) -> bool:
+        try:
+            return self._path(key).is_file()
+        except FileNotFoundError:
+            return False
+
+    def save_fileobj(self, key: str, fileobj: BinaryIO):
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with target.open("wb") as fp:
+            shutil.copyfileobj(fileobj, fp, length=1024 * 64)
+
+    def put_file(self, key: str, source: Path):
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(source), str(target))
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def local_path(self, key: str) -> Path:
+        return self._path(key)
+
+    def delete(self, key: str):
+        try:
+            path = self._path(key)
+            path.unlink()
+        except FileNotFoundError:
+            return
+        except OSError:
+            return
+        # 清理删除后留下的空目录（如 variants/<key>/），保留 root 下的第一级目录
+        for parent in path.parents:
+            if parent == self.root or parent.parent == self.root:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+
+class LocalReadCache:
+    """
+    容量受限的本地读穿缓存。各文件大小与最近访问时间记在 SQLite 索引中，
+    总量超过 max_bytes 才按 LRU 淘汰到低水位，不必每次未命中都遍历整个缓存目录。
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int,
+        *,
+        low_water: float = 0.9,
+        min_age_seconds: float = 300.0,
+        index_path: Optional[Path] = None,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * low_water)
+        # 刚被访问的文件可能正由其他请求发送，淘汰时跳过
+        self.min_age_seconds = min_age_seconds
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = Path(index_path) if index_path else self.root / ".index.db"
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    used_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_used ON cache_entries (used_at)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.index_path), timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / f"{digest}{Path(key).suffix.lower()}"
+
+    def _record(self, target: Path, size: int):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (name, size, used_at) VALUES (?, ?, ?)",
+                (target.relative_to(self.root).as_posix(), size, time.time()),
+            )
+        finally:
+            conn.close()
+
+    def get_or_fetch(self, key: str, fetch: Callable[[Path], None]) -> Path:
+        target = self._path(key)
+        try:
+            size = target.stat().st_size
+        except FileNotFoundError:
+            # 未命中，或命中后恰好被其他进程淘汰，重新下载
+            size = None
+        if size is not None:
+            self._record(target, size)
+            return target
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".tmp-{uuid.uuid4().hex}")
+        try:
+            fetch(tmp_path)
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, target)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self._record(target, size)
+        self._evict(keep=target)
+        return target
+
+    def discard(self, key: str):
+        target = self._path(key)
+        try:
+            target.unlink()
+        except OSError:
+            pass
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM cache_entries WHERE name = ?", (target.relative_to(self.root).as_posix(),))
+        finally:
+            conn.close()
+
+    def _evict(self, keep: Optional[Path] = None):
+        conn = self._connect()
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+                candidates = conn.execute(
+                    "SELECT name, size FROM cache_entries WHERE used_at < ? ORDER BY used_at",
+                    (time.time() - self.min_age_seconds,),
+                ).fetchall()
+                keep_name = keep.relative_to(self.root).as_posix() if keep else None
+                for name, size in candidates:
+                    if total <= self.low_water_bytes:
+                        break
+                    if name == keep_name:
+                        continue
+                    try:
+                        (self.root / name).unlink()
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        continue
+                    conn.execute("DELETE FROM cache_entries WHERE name = ?", (name,))
+                    total -= size
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+
+class S3Storage:
+    """S3 兼容对象存储（AWS S3 / MinIO 等），读取时经本地缓存落盘"""
+
+    def __init__(
+        self,
+        bucket: str,
+        cache: LocalReadCache,
+        *,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        client=None,
+    ):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("未安装 boto3，无法使用 S3 存储")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache = cache
+
+    def _object_key(self, key: str) -> str:
+        key = key.lstrip("/")
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _head(self, key: str) -> Optional[dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as exc:
+            code = str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+            if code in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def save_fileobj(self, key: str, fileobj: BinaryIO):
+        self.client.upload_fileobj(fileobj, self.bucket, self._object_key(key))
+
+    def put_file(self, key: str, source: Path):
+        try:
+            self.client.upload_file(str(source), self.bucket, self._object_key(key))
+        finally:
+            try:
+                Path(source).unlink()
+            except OSError:
+                pass
+
+    def size(self, key: str) -> int:
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return int(head.get("ContentLength", 0))
+
+    def local_path(self, key: str) -> Path:
+        def fetch(target: Path):
+            try:
+                self.client.download_file(self.bucket, self._object_key(key), str(target))
+            except ClientError as exc:
+                raise FileNotFoundError(key) from exc
+
+        return self.cache.get_or_fetch(key, fetch)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        self.cache.discard(key)
+
+
+def create_storage(upload_dir: Path, cache_dir: Path):
+    """根据环境变量 STORAGE_BACKEND=local|s3 创建存储后端"""
+    backend = os.getenv("STORAGE_BACKEND", "local").strip().lower()
+    if backend != "s3":
+        return LocalStorage(upload_dir)
+
+    bucket = os.getenv("S3_BUCKET", "").strip()
+    if not bucket:
+        raise RuntimeError("STORAGE_BACKEND=s3 时必须配置 S3_BUCKET")
+    cache = LocalReadCache(
+        cache_dir,
+        max_bytes=int(os.getenv("STORAGE_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024))),
+    )
+    return S3Storage(
+        bucket,
+        cache,
+        prefix=os.getenv("S3_PREFIX", ""),
+        endpoint_url=os.getenv("S3_ENDPOINT_URL", "").strip() or None,
+    )
+
+
+def temp_download_path(suffix: str) -> Path:
+    """下载中转用的临时文件路径，写完后交给存储后端"""
+    fd, tmp_name = tempfile.mkstemp(suffix=suffix, prefix="download-")
+    os.close(fd)
+    return Path(tmp_name)
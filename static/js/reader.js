@@ -43,6 +43,48 @@ function escapeHtml(input) {
         .replace(/'/g, '&#39;');
 }
 
+const pendingRequests = new Map();
+
+function newRequestId() {
+    if (window.crypto && window.crypto.randomUUID) {
+        return window.crypto.randomUUID().replace(/-/g, '');
+    }
+    return `${Date.now().toString(16)}${Math.random().toString(16).slice(2)}`;
+}
+
+function cancelRequest(requestId) {
+    const pending = pendingRequests.get(requestId);
+    if (!pending) return;
+    pendingRequests.delete(requestId);
+    if (navigator.sendBeacon) {
+        navigator.sendBeacon(`/api/requests/${requestId}/cancel`);
+    }
+    pending.controller.abort();
+}
+
+function cancelRequestGroup(group) {
+    Array.from(pendingRequests.entries())
+        .filter(([, pending]) => pending.group === group)
+        .forEach(([requestId]) => cancelRequest(requestId));
+}
+
+// 带请求 ID 的 fetch：离开页面或同组新请求发起时通知后端停止剩余的模型/OCR 调用
+function cancellableFetch(url, options = {}, group = '') {
+    if (group) {
+        cancelRequestGroup(group);
+    }
+    const requestId = newRequestId();
+    const controller = new AbortController();
+    pendingRequests.set(requestId, { controller, group });
+    const headers = Object.assign({}, options.headers, { 'X-Request-Id': requestId });
+    return fetch(url, Object.assign({}, options, { headers, signal: controller.signal }))
+        .finally(() => pendingRequests.delete(requestId));
+}
+
+window.addEventListener('pagehide', () => {
+    Array.from(pendingRequests.keys()).forEach(cancelRequest);
+});
+
 function extractMermaidCode(content) {
     const text = (content || '').trim();
     if (!text) return null;
@@ -52,53 +94,65 @@ function extractMermaidCode(content) {
     return null;
 }
 
-function renderMermaidIn(container) {
-    if (!container || !window.mermaid) return;
-    try {
-        window.mermaid.initialize({ startOnLoad: false, theme: 'default' });
-    } catch (_) {}
-    try {
-        const result = window.mermaid.run({ nodes: [container] });
-        if (result && typeof result.then === 'function') {
-            result.catch(() => {});
-        }
-    } catch (_) {}
+let mermaidLoader = null;
+
+function loadMermaid() {
+    if (window.mermaid) return Promise.resolve(window.mermaid);
+    if (mermaidLoader) return mermaidLoader;
+    mermaidLoader = new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = window.__MERMAID_SRC__;
+        script.async = true;
+        script.onload = () => {
+            try {
+                window.mermaid.initialize({ startOnLoad: false, theme: 'default' });
+            } catch (_) {}
+            resolve(window.mermaid);
+        };
+        script.onerror = () => {
+            mermaidLoader = null;
+            reject(new Error('mermaid load failed'));
+        };
+        document.head.appendChild(script);
+    });
+    return mermaidLoader;
+}
+
+function renderMindmapFallback(panel, title, content) {
+    panel.innerHTML = `
+        <h4>${title}</h4>
+        <div class="markdown-body">${renderMarkdown(content)}</div>
+    `;
 }
 
 function renderMindmap(panel, title, content) {
     if (!panel) return;
     const code = extractMermaidCode(content);
-    if (code) {
-        panel.innerHTML = `
-            <h4>${title}</h4>
-            <div class="mindmap-wrap">
-                <div class="mermaid">${escapeHtml(code)}</div>
-            </div>
-        `;
-        const node = panel.querySelector('.mermaid');
-        try {
-            const result = window.mermaid ? window.mermaid.run({ nodes: [node] }) : null;
-            if (result && typeof result.then === 'function') {
-                result.catch(() => {
-                    panel.innerHTML = `
-                        <h4>${title}</h4>
-                        <div class="markdown-body">${renderMarkdown(content)}</div>
-                    `;
-                });
-            }
-            return;
-        } catch (_) {
-            panel.innerHTML = `
-                <h4>${title}</h4>
-                <div class="markdown-body">${renderMarkdown(content)}</div>
-            `;
-            return;
-        }
+    if (!code) {
+        renderMindmapFallback(panel, title, content);
+        return;
     }
     panel.innerHTML = `
         <h4>${title}</h4>
-        <div class="markdown-body">${renderMarkdown(content)}</div>
+        <div class="mindmap-wrap">
+            <div class="loading"><span class="spinner"></span>正在加载思维导图...</div>
+            <div class="mermaid" hidden>${escapeHtml(code)}</div>
+        </div>
     `;
+    const node = panel.querySelector('.mermaid');
+    loadMermaid()
+        .then(mermaid => {
+            if (!panel.contains(node)) return null;
+            const loading = panel.querySelector('.mindmap-wrap .loading');
+            if (loading) loading.remove();
+            node.hidden = false;
+            return mermaid.run({ nodes: [node] });
+        })
+        .catch(() => {
+            if (panel.contains(node)) {
+                renderMindmapFallback(panel, title, content);
+            }
+        });
 }
 
 function setAiState(open) {
@@ -190,6 +244,13 @@ function loadCompareOptions() {
         .catch(() => {});
 }
 
+function pickImageVariant(doc, targetWidth) {
+    const variants = ((doc.image && doc.image.variants) || []).filter(item => item.format === 'webp');
+    if (!variants.length) return null;
+    variants.sort((a, b) => a.width - b.width);
+    return variants.find(item => item.width >= targetWidth) || variants[variants.length - 1];
+}
+
 function renderCompareDocument(doc) {
     if (!compareCanvas) return;
     if (!doc) {
@@ -205,7 +266,9 @@ function renderCompareDocument(doc) {
         return;
     }
     if (['.png', '.jpg', '.jpeg', '.gif', '.webp'].some(ext => lower.endsWith(ext))) {
-        compareCanvas.innerHTML = `<img src="${fileUrl}" alt="${doc.original_name}">`;
+        const variant = pickImageVariant(doc, compareCanvas.clientWidth * (window.devicePixelRatio || 1));
+        const imageUrl = variant ? `/uploads/${encodeURI(variant.key)}` : fileUrl;
+        compareCanvas.innerHTML = `<img src="${imageUrl}" alt="${doc.original_name}">`;
         return;
     }
     if (['.txt', '.md', '.csv', '.json'].some(ext => lower.endsWith(ext))) {
@@ -294,12 +357,48 @@ function resetCompareSummary() {
     }
 }
 
+const LAZY_SECTIONS = ['deep_read', 'translation', 'mindmap'];
+
+function isTabActive(buttons, type) {
+    return Array.from(buttons).some(button => button.dataset.tab === type && button.classList.contains('active'));
+}
+
+function ensureAnalysisSection(id, data, type) {
+    if (!data || !LAZY_SECTIONS.includes(type) || typeof data[type] === 'string') {
+        return Promise.resolve(data);
+    }
+    return fetch(`/api/documents/${id}/analysis?sections=${type}`)
+        .then(res => res.json())
+        .then(payload => {
+            if (payload.success) {
+                Object.assign(data, payload.analysis);
+            }
+        })
+        .catch(() => {})
+        .then(() => {
+            if (typeof data[type] !== 'string') {
+                data[type] = '';
+            }
+            return data;
+        });
+}
+
 function setCompareAnalysisContent(type) {
     if (!compareAnalysisPanel) return;
     if (!compareAnalysisData) {
         compareAnalysisPanel.innerHTML = '<p class="muted">请选择右侧文档以开始对比</p>';
         return;
     }
+    if (LAZY_SECTIONS.includes(type) && typeof compareAnalysisData[type] !== 'string') {
+        const pending = compareAnalysisData;
+        compareAnalysisPanel.innerHTML = '<div class="loading"><span class="spinner"></span>正在加载...</div>';
+        ensureAnalysisSection(compareDocId, pending, type).then(() => {
+            if (pending === compareAnalysisData && isTabActive(compareTabButtons, type)) {
+                setCompareAnalysisContent(type);
+            }
+        });
+        return;
+    }
     const map = {
         summary: {
             title: '全文总结',
@@ -334,6 +433,7 @@ if (compareSelect) {
         const selectedId = compareSelect.value;
         compareDocId = selectedId;
         if (!selectedId) {
+            cancelRequestGroup('compare-analysis');
             renderCompareDocument(null);
             resetCompareSummary();
             return;
@@ -350,7 +450,7 @@ if (compareSelect) {
         if (compareAnalysisPanel) {
             compareAnalysisPanel.innerHTML = '<div class="loading"><span class="spinner"></span>正在调用 AI 解读...</div>';
         }
-        fetch(`/api/documents/${selectedId}/analysis`)
+        cancellableFetch(`/api/documents/${selectedId}/analysis?sections=summary`, {}, 'compare-analysis')
             .then(res => res.json())
             .then(data => {
                 if (data.success) {
@@ -361,7 +461,8 @@ if (compareSelect) {
                     compareAnalysisPanel.innerHTML = `<p>${data.error || '分析失败，请稍后重试。'}</p>`;
                 }
             })
-            .catch(() => {
+            .catch(err => {
+                if (err && err.name === 'AbortError') return;
                 if (compareAnalysisPanel) {
                     compareAnalysisPanel.innerHTML = '<p>获取分析失败，请检查网络。</p>';
                 }
@@ -380,6 +481,15 @@ if (compareUploadBtn && compareUploadInput) {
 
 function setAnalysisContent(type) {
     if (!analysisData) return;
+    if (LAZY_SECTIONS.includes(type) && typeof analysisData[type] !== 'string') {
+        analysisPanel.innerHTML = '<div class="loading"><span class="spinner"></span>正在加载...</div>';
+        ensureAnalysisSection(docId, analysisData, type).then(() => {
+            if (isTabActive(tabButtons, type)) {
+                setAnalysisContent(type);
+            }
+        });
+        return;
+    }
     const map = {
         summary: {
             title: '全文总结',
@@ -410,7 +520,7 @@ function setAnalysisContent(type) {
 }
 
 function fetchAnalysis() {
-    fetch(`/api/documents/${docId}/analysis`)
+    cancellableFetch(`/api/documents/${docId}/analysis?sections=summary`)
         .then(res => res.json())
         .then(data => {
             if (data.success) {
@@ -461,9 +571,9 @@ if (qaForm) {
 
         const payload = { question };
         if (compareActive && compareDocId) {
-            payload.compare_doc_id = compareDocId;
+            payload.compare_doc_ids = [compareDocId];
         }
-        fetch(`/api/documents/${docId}/ask`, {
+        cancellableFetch(`/api/documents/${docId}/ask`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify(payload),
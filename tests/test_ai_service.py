@@ -0,0 +1,151 @@
+import pytest
+
+from services import ai_service
+from services.ai_service import DocumentAIClient
+from services.cache_service import AnswerCache
+from services.deadline_service import Deadline, DeadlineExceeded, check_deadline
+
+
+class RecordingClient(DocumentAIClient):
+    """用预设回复替代真实模型调用，记录每次调用的提示词"""
+
+    def __init__(self, replies=None, **kwargs):
+        super().__init__(**kwargs)
+        self.replies = list(replies or [])
+        self.prompts = []
+
+    def _request(self, system_prompt, user_prompt, *, model=None, priority=None, deadline=None):
+        check_deadline(deadline)
+        self.prompts.append(user_prompt)
+        return self.replies.pop(0) if self.replies else "回答"
+
+
+@pytest.fixture
+def client(tmp_path):
+    instance = RecordingClient(answer_cache=AnswerCache(tmp_path / "cache.db"))
+    instance.ask_char_budget = 12000
+    instance.ask_min_excerpt_chars = 1500
+    return instance
+
+
+def _long_text(seed: str) -> str:
+    return "\n\n".join(f"{seed} 第{index}段 收入 利润 " * 20 for index in range(200))
+
+
+def test_multiple_documents_within_budget_use_one_call(client):
+    documents = [("a.txt", _long_text("甲")), ("b.txt", _long_text("乙"))]
+    assert client.ask_about_multiple_documents("收入", documents) == "回答"
+    assert len(client.prompts) == 1
+    assert "文档A: a.txt" in client.prompts[0] and "文档B: b.txt" in client.prompts[0]
+    assert len(client.prompts[0]) <= client.ask_char_budget + 200
+
+
+def test_many_documents_fan_out_with_full_excerpt_budget(client):
+    documents = [(f"{index}.txt", _long_text(str(index))) for index in range(10)]
+    client.ask_about_multiple_documents("收入", documents)
+    # 10 篇逐篇作答 + 1 次综合
+    assert len(client.prompts) == 11
+    per_document = client.prompts[:10]
+    assert all(len(prompt) > client.ask_char_budget // 2 for prompt in per_document)
+
+
+def test_fan_out_answers_come_from_shared_cache(client, tmp_path):
+    documents = [(f"{index}.txt", _long_text(str(index))) for index in range(10)]
+    client.ask_about_multiple_documents("收入", documents)
+
+    other = RecordingClient(answer_cache=AnswerCache(tmp_path / "cache.db"))
+    other.ask_char_budget = client.ask_char_budget
+    other.ask_min_excerpt_chars = client.ask_min_excerpt_chars
+    other.ask_about_multiple_documents("收入", documents)
+    assert len(other.prompts) == 1
+
+
+def test_error_answers_are_not_cached(client):
+    documents = [(f"{index}.txt", _long_text(str(index))) for index in range(10)]
+    client.replies = ["调用 DashScope 失败: boom"] + ["回答"] * 10
+    client.ask_about_multiple_documents("收入", documents)
+    client.prompts.clear()
+    client.ask_about_multiple_documents("收入", documents)
+    assert len(client.prompts) == 2
+
+
+def test_insights_stop_at_first_busy_step(client):
+    client.replies = ["摘要内容", client.BUSY_MESSAGE]
+    progress = {}
+    assert client.generate_document_insights("正文 " * 50, "a.txt", progress=progress) == {"_busy": True}
+    assert len(client.prompts) == 2
+    assert progress["summary"] == "摘要内容"
+    assert "deep_read" not in progress
+
+
+def _multi_chunk_text() -> str:
+    return "\n".join(f"第{index}行 " + "内容" * 600 for index in range(3))
+
+
+def test_translation_resumes_from_done_parts(client):
+    text = _multi_chunk_text()
+    done_parts = []
+    client.replies = ["译文一", "调用 DashScope 失败: timeout", "译文三"]
+    client.translate_document("", text, "a.txt", done_parts=done_parts)
+    assert done_parts == ["译文一", None, "译文三"]
+
+    client.prompts.clear()
+    client.replies = ["译文二"]
+    assert client.translate_document("", text, "a.txt", done_parts=done_parts) == "译文一\n\n译文二\n\n译文三"
+    assert len(client.prompts) == 1
+    assert "第 2/3 段" in client.prompts[0]
+
+
+def test_translation_stops_at_first_busy_chunk(client):
+    done_parts = []
+    client.replies = ["译文一", client.BUSY_MESSAGE]
+    assert client.translate_document("", _multi_chunk_text(), "a.txt", done_parts=done_parts) == client.BUSY_MESSAGE
+    assert len(client.prompts) == 2
+    assert done_parts == ["译文一", None, None]
+
+
+def test_insights_resume_skips_completed_steps(client):
+    text = "正文 " * 50
+    progress = {}
+    client.replies = ["摘要", "精读", client.BUSY_MESSAGE]
+    assert client.generate_document_insights(text, "a.txt", progress=progress) == {"_busy": True}
+    assert progress["summary"] == "摘要" and progress["deep_read"] == "精读"
+
+    client.prompts.clear()
+    client.replies = ["译文", "```mermaid\nmindmap\n```"]
+    result = client.generate_document_insights(text, "a.txt", progress=progress)
+    assert len(client.prompts) == 2
+    assert result["summary"] == "摘要" and result["deep_read"] == "精读"
+
+
+def test_insights_progress_resets_when_text_changes(client):
+    progress = {}
+    client.generate_document_insights("旧正文", "a.txt", progress=progress)
+    client.prompts.clear()
+    client.generate_document_insights("新正文", "a.txt", progress=progress)
+    assert len(client.prompts) == 4
+
+
+def test_insights_raise_when_deadline_expired(client):
+    with pytest.raises(DeadlineExceeded):
+        client.generate_document_insights("正文", "a.txt", deadline=Deadline(cancel_check=lambda: True))
+    assert client.prompts == []
+
+
+def test_sdk_timeout_is_clamped_to_remaining_budget(monkeypatch):
+    calls = []
+
+    class StubGeneration:
+        @staticmethod
+        def call(**kwargs):
+            calls.append(kwargs)
+            raise TimeoutError("timed out")
+
+    monkeypatch.setattr(ai_service, "Generation", StubGeneration)
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test-key")
+    instance = DocumentAIClient()
+
+    assert instance._request("s", "u", deadline=Deadline(5)).startswith("调用 DashScope 失败")
+    assert 4 < calls[-1]["request_timeout"] <= 5
+    instance._request("s", "u")
+    assert calls[-1]["request_timeout"] == instance.request_timeout
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from services.asset_service import AssetPipeline
+
+
+class AcceptEncodings(dict):
+    """与 werkzeug 的 Accept 对象一致：未列出的编码 q 值为 0"""
+
+    def __getitem__(self, key):
+        return self.get(key, 0)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    static_dir = tmp_path / "static"
+    (static_dir / "js").mkdir(parents=True)
+    (static_dir / "js" / "app.js").write_text("console.log('hello');\n" * 200, encoding="utf-8")
+    (static_dir / "logo.png").write_bytes(b"\x89PNG" + b"\0" * 64)
+    return AssetPipeline(static_dir, tmp_path / "dist")
+
+
+def test_build_writes_hashed_files_and_manifest(pipeline):
+    manifest = pipeline.build()
+    hashed = manifest["js/app.js"]
+    assert hashed.startswith("js/app.") and hashed.endswith(".js")
+    assert (pipeline.dist_dir / hashed).exists()
+    assert (pipeline.dist_dir / f"{hashed}.gz").exists()
+    assert not (pipeline.dist_dir / f"{manifest['logo.png']}.gz").exists()
+    assert AssetPipeline(pipeline.static_dir, pipeline.dist_dir).load() == manifest
+
+
+def test_rebuild_restores_missing_compressed_variant(pipeline):
+    hashed = pipeline.build()["js/app.js"]
+    gz_path = pipeline.dist_dir / f"{hashed}.gz"
+    gz_path.unlink()
+    pipeline.build()
+    assert gz_path.exists()
+
+
+def test_pick_variant_respects_quality_values(pipeline):
+    hashed = pipeline.build()["js/app.js"]
+    path, encoding = pipeline.pick_variant(hashed, AcceptEncodings(gzip=0))
+    assert encoding is None and path == pipeline.dist_dir / hashed
+    path, encoding = pipeline.pick_variant(hashed, AcceptEncodings(gzip=0.5))
+    assert encoding == "gzip" and path.name.endswith(".gz")
+    assert pipeline.pick_variant(hashed, AcceptEncodings())[1] is None
+
+
+def test_load_or_build_reuses_fresh_manifest_and_rebuilds_stale(pipeline):
+    manifest = pipeline.load_or_build()
+    built_at = pipeline.manifest_path.stat().st_mtime
+
+    assert AssetPipeline(pipeline.static_dir, pipeline.dist_dir).load_or_build() == manifest
+    assert pipeline.manifest_path.stat().st_mtime == built_at
+
+    source = pipeline.static_dir / "js" / "app.js"
+    source.write_text("console.log('changed');\n" * 200, encoding="utf-8")
+    os.utime(source, (built_at + 10, built_at + 10))
+    rebuilt = AssetPipeline(pipeline.static_dir, pipeline.dist_dir).load_or_build()
+    assert rebuilt["js/app.js"] != manifest["js/app.js"]
@@ -0,0 +1,65 @@
+import pytest
+
+from services.blob_service import (
+    BlobStore,
+    analysis_sections,
+    collect_blob_refs,
+    externalize_analysis,
+    externalize_documents,
+    hydrate_analysis,
+    needs_externalize,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(tmp_path / "blobs")
+
+
+def _analysis():
+    return {
+        "summary": "摘要",
+        "deep_read": "精读" * 500,
+        "translation": "translation",
+        "mindmap": "```mermaid\nmindmap\n```",
+    }
+
+
+def test_put_text_is_content_addressed(store):
+    ref = store.put_text("正文")
+    assert store.put_text("正文") == ref
+    assert store.get_text(ref) == "正文"
+    store.delete(ref)
+    assert store.get_text(ref) is None
+
+
+def test_externalize_keeps_only_references(store):
+    compact = externalize_analysis(store, _analysis())
+    assert compact["summary"] == "摘要"
+    assert set(compact["_blobs"]) == {"deep_read", "translation", "mindmap"}
+    assert not needs_externalize(compact)
+    assert analysis_sections(compact) == {"summary", "deep_read", "translation", "mindmap"}
+    assert hydrate_analysis(store, compact) == _analysis()
+
+
+def test_hydrate_returns_only_requested_sections(store):
+    compact = externalize_analysis(store, _analysis())
+    assert hydrate_analysis(store, compact, ["mindmap"]) == {
+        "summary": "摘要",
+        "mindmap": _analysis()["mindmap"],
+    }
+    assert hydrate_analysis(store, compact, []) == {"summary": "摘要"}
+
+
+def test_externalize_documents_migrates_only_inline_records(store):
+    already = externalize_analysis(store, _analysis())
+    documents = [
+        {"id": "a", "analysis": _analysis()},
+        {"id": "b", "analysis": dict(already)},
+        {"id": "c", "analysis": None},
+    ]
+    assert externalize_documents(store, documents) == 1
+    assert documents[0]["analysis"] == already
+    assert documents[2]["analysis"] is None
+    assert externalize_documents(store, documents) == 0
+    assert collect_blob_refs(documents[0]) == set(already["_blobs"].values())
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from services.deadline_service import CancellationRegistry, Deadline, DeadlineExceeded, check_deadline
+
+
+def test_deadline_without_budget_never_expires():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert deadline.timeout(15) == 15
+    check_deadline(deadline)
+    check_deadline(None)
+
+
+def test_timeout_is_clamped_to_remaining_budget():
+    deadline = Deadline(2)
+    assert 1 < deadline.timeout(15) <= 2
+    assert deadline.timeout(0.5) == 0.5
+
+
+def test_expired_budget_raises():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.timeout(15) == 0.1
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+
+def test_cancellation_is_shared_across_registries(tmp_path):
+    first = CancellationRegistry(tmp_path / "scheduler.db")
+    second = CancellationRegistry(tmp_path / "scheduler.db")
+    deadline = second.deadline_for("req-1", 60)
+    assert not deadline.expired()
+
+    first.cancel("req-1")
+    with pytest.raises(DeadlineExceeded, match="取消"):
+        deadline.check()
+    assert not second.deadline_for("req-2", 60).expired()
+    assert not second.deadline_for(None, 60).expired()
@@ -0,0 +1,13 @@
+from services.document_service import load_documents, store_documents
+
+
+def test_store_documents_replaces_file_atomically(tmp_path):
+    data_file = tmp_path / "data" / "documents.json"
+    store_documents(data_file, [{"id": "a", "original_name": "报告.pdf"}])
+    store_documents(data_file, [{"id": "b"}])
+    assert load_documents(data_file) == [{"id": "b"}]
+    assert [path.name for path in data_file.parent.iterdir()] == ["documents.json"]
+
+
+def test_load_documents_missing_file_is_empty(tmp_path):
+    assert load_documents(tmp_path / "missing.json") == []
@@ -0,0 +1,65 @@
+import io
+
+import pytest
+
+from services.image_service import OCR_MAX_SIDE, image_variant_keys, ingest_image, is_image_key
+from services.storage_service import LocalStorage
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(tmp_path / "uploads")
+
+
+def _save(storage, key: str, image, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, **params)
+    buffer.seek(0)
+    storage.save_fileobj(key, buffer)
+
+
+def test_rotated_jpeg_gets_upright_variants(storage):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 顺时针旋转 90°
+    _save(storage, "photo.jpg", Image.new("RGB", (3000, 2000), (200, 100, 50)), format="JPEG", exif=exif)
+
+    info = ingest_image(storage, "photo.jpg")
+
+    assert (info["width"], info["height"], info["orientation"]) == (2000, 3000, 6)
+    widths = [variant["width"] for variant in info["variants"]]
+    assert widths == sorted(widths)
+    assert sorted(set(widths)) == [480, 960, 1600]
+    for variant in info["variants"]:
+        assert variant["height"] == round(variant["width"] * 1.5)
+        with Image.open(str(storage.local_path(variant["key"]))) as stored:
+            assert stored.size == (variant["width"], variant["height"])
+    with Image.open(str(storage.local_path(info["ocr_variant"]))) as ocr:
+        assert ocr.mode == "L"
+        assert max(ocr.size) <= OCR_MAX_SIDE
+
+
+def test_small_image_keeps_its_own_width(storage):
+    _save(storage, "icon.png", Image.new("RGBA", (300, 120)), format="PNG")
+    info = ingest_image(storage, "icon.png")
+    assert {variant["width"] for variant in info["variants"]} == {300}
+    assert image_variant_keys({"image": info})[-1] == info["ocr_variant"]
+
+
+def test_unreadable_image_returns_none(storage):
+    storage.save_fileobj("broken.png", io.BytesIO(b"not an image"))
+    assert ingest_image(storage, "broken.png") is None
+
+
+def test_deleting_variants_removes_empty_directory(storage):
+    _save(storage, "icon.png", Image.new("RGB", (300, 120)), format="PNG")
+    info = ingest_image(storage, "icon.png")
+    for key in image_variant_keys({"image": info}):
+        storage.delete(key)
+    assert not (storage.root / "variants" / "icon.png").exists()
+
+
+def test_is_image_key():
+    assert is_image_key("a/b/photo.JPG")
+    assert not is_image_key("report.pdf")
@@ -0,0 +1,92 @@
+import zipfile
+
+from services.ooxml_service import extract_docx_text, extract_pptx_text
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+A = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+P = 'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"'
+R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+PKG = 'xmlns="http://schemas.openxmlformats.org/package/2006/relationships"'
+REL_BASE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _paragraph(text: str) -> str:
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def _write_docx(path, body: str):
+    with zipfile.ZipFile(str(path), "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {W}><w:body>{body}</w:body></w:document>")
+        archive.writestr("word/media/image1.png", b"\x89PNG" + b"\0" * 1024)
+
+
+def _shape(*paragraphs: str) -> str:
+    runs = "".join(f"<a:p><a:r><a:t>{text}</a:t></a:r></a:p>" for text in paragraphs)
+    return f"<p:sp><p:txBody>{runs}</p:txBody></p:sp>"
+
+
+def _slide(*paragraphs: str) -> str:
+    return f"<p:sld {A} {P}><p:cSld><p:spTree>{_shape(*paragraphs)}</p:spTree></p:cSld></p:sld>"
+
+
+def _write_pptx(path, slides, *, notes=None):
+    """slides 按放映顺序给出 (part 名, 文字列表)；presentation.xml 的顺序与 part 编号可以不同"""
+    notes = notes or {}
+    sld_ids = "".join(f'<p:sldId id="{256 + index}" r:id="rId{index}"/>' for index in range(len(slides)))
+    rels = "".join(
+        f'<Relationship Id="rId{index}" Type="{REL_BASE}/slide" Target="slides/{part}"/>'
+        for index, (part, _) in enumerate(slides)
+    )
+    with zipfile.ZipFile(str(path), "w") as archive:
+        archive.writestr("ppt/presentation.xml", f"<p:presentation {P} {R}><p:sldIdLst>{sld_ids}</p:sldIdLst></p:presentation>")
+        archive.writestr("ppt/_rels/presentation.xml.rels", f"<Relationships {PKG}>{rels}</Relationships>")
+        for part, texts in slides:
+            archive.writestr(f"ppt/slides/{part}", _slide(*texts))
+            if part in notes:
+                notes_part = f"notes_{part}"
+                archive.writestr(
+                    f"ppt/slides/_rels/{part}.rels",
+                    f'<Relationships {PKG}><Relationship Id="rId1" Type="{REL_BASE}/notesSlide" '
+                    f'Target="../notesSlides/{notes_part}"/></Relationships>',
+                )
+                archive.writestr(f"ppt/notesSlides/{notes_part}", _slide(*notes[part]))
+
+
+def test_docx_paragraphs_and_tables_keep_document_order(tmp_path):
+    path = tmp_path / "sample.docx"
+    table = (
+        "<w:tbl>"
+        f"<w:tr><w:tc>{_paragraph('项目')}</w:tc><w:tc>{_paragraph('金额')}</w:tc></w:tr>"
+        f"<w:tr><w:tc>{_paragraph('收入')}</w:tc><w:tc>{_paragraph('100')}</w:tc></w:tr>"
+        "</w:tbl>"
+    )
+    _write_docx(path, _paragraph("第一段") + table + "<w:p/>" + _paragraph("结尾"))
+    assert extract_docx_text(path) == "第一段\n项目 | 金额\n收入 | 100\n结尾"
+
+
+def test_docx_respects_char_budget(tmp_path):
+    path = tmp_path / "long.docx"
+    _write_docx(path, "".join(_paragraph(f"段落{index:03d}") for index in range(500)))
+    text = extract_docx_text(path, max_chars=20)
+    assert len(text) <= 20
+    assert text.startswith("段落000\n段落001")
+    assert not text.endswith("\n")
+
+
+def test_pptx_follows_presentation_order_and_notes(tmp_path):
+    path = tmp_path / "deck.pptx"
+    _write_pptx(
+        path,
+        [("slide2.xml", ["封面"]), ("slide1.xml", ["第二页", "要点"])],
+        notes={"slide1.xml": ["讲稿"]},
+    )
+    assert extract_pptx_text(path) == "[幻灯片 1]\n封面\n[幻灯片 2]\n第二页\n要点\n[备注]\n讲稿"
+    assert "讲稿" not in extract_pptx_text(path, include_notes=False)
+
+
+def test_pptx_falls_back_to_slide_numbers_without_presentation_part(tmp_path):
+    path = tmp_path / "bare.pptx"
+    with zipfile.ZipFile(str(path), "w") as archive:
+        archive.writestr("ppt/slides/slide10.xml", _slide("十"))
+        archive.writestr("ppt/slides/slide2.xml", _slide("二"))
+    assert extract_pptx_text(path) == "[幻灯片 1]\n二\n[幻灯片 2]\n十"
@@ -0,0 +1,132 @@
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from services.scheduler_service import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    ModelCallScheduler,
+    _parse_rate_limits,
+)
+
+
+def _scheduler(tmp_path, **kwargs):
+    options = {
+        "rate_per_minute": 60.0,
+        "burst": 2.0,
+        "max_wait": {PRIORITY_INTERACTIVE: 0.5, PRIORITY_BACKGROUND: 0.5},
+        "poll_interval": 0.01,
+    }
+    options.update(kwargs)
+    return ModelCallScheduler(tmp_path / "scheduler.db", **options)
+
+
+def _waiter_count(scheduler) -> int:
+    conn = sqlite3.connect(str(scheduler.db_path))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_parse_rate_limits_skips_invalid_items():
+    assert _parse_rate_limits("a=60, b = 30,c=,=5,d=x") == {"a": 60.0, "b": 30.0}
+
+
+def test_burst_is_granted_then_rejected_when_empty(tmp_path):
+    scheduler = _scheduler(tmp_path, rate_per_minute=0.001)
+    assert scheduler.acquire("m", PRIORITY_INTERACTIVE)
+    assert scheduler.acquire("m", PRIORITY_INTERACTIVE)
+    assert not scheduler.acquire("m", PRIORITY_INTERACTIVE, timeout=0.05)
+
+    queue = scheduler.metrics()["models"]["m"]["queues"]["interactive"]
+    assert queue["granted"] == 2
+    assert queue["rejected"] == 1
+    assert queue["depth"] == 0
+
+
+def test_models_have_separate_buckets(tmp_path):
+    scheduler = _scheduler(tmp_path, rate_per_minute=0.001, burst=1.0)
+    assert scheduler.acquire("a")
+    assert scheduler.acquire("b")
+    assert not scheduler.acquire("a", timeout=0.05)
+
+
+def test_full_queue_rejects_immediately(tmp_path):
+    scheduler = _scheduler(tmp_path, max_queue={PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0})
+    assert not scheduler.acquire("m", PRIORITY_INTERACTIVE)
+    assert _waiter_count(scheduler) == 0
+
+
+def test_tokens_refill_while_waiting(tmp_path):
+    scheduler = _scheduler(tmp_path, rate_per_minute=600.0, burst=1.0)
+    assert scheduler.acquire("m")
+    assert scheduler.acquire("m", timeout=0.5)
+
+
+def test_concurrent_waiters_are_all_served(tmp_path):
+    scheduler = _scheduler(
+        tmp_path,
+        rate_per_minute=1200.0,
+        burst=1.0,
+        max_wait={PRIORITY_INTERACTIVE: 5.0, PRIORITY_BACKGROUND: 5.0},
+    )
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(scheduler.acquire("m", PRIORITY_BACKGROUND)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [True] * 4
+    assert _waiter_count(scheduler) == 0
+
+
+def test_ticket_is_released_when_acquire_raises(tmp_path):
+    scheduler = _scheduler(tmp_path, rate_per_minute=0.001, burst=0.5)
+
+    def interrupted(*_args, **_kwargs):
+        raise SystemExit()
+
+    scheduler._try_take = interrupted
+    with pytest.raises(SystemExit):
+        scheduler.acquire("m")
+    assert _waiter_count(scheduler) == 0
+
+
+def _insert_orphan(scheduler, *, priority, enqueued_at, pid):
+    conn = sqlite3.connect(str(scheduler.db_path))
+    try:
+        conn.execute(
+            "INSERT INTO waiters (ticket, model, priority, enqueued_at, pid) VALUES (?, ?, ?, ?, ?)",
+            ("orphan", "m", priority, enqueued_at, pid),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_rows_of_killed_processes_do_not_block_queue(tmp_path):
+    scheduler = _scheduler(tmp_path, max_wait={PRIORITY_INTERACTIVE: 60.0, PRIORITY_BACKGROUND: 60.0})
+    _insert_orphan(scheduler, priority=PRIORITY_INTERACTIVE, enqueued_at=time.time(), pid=_dead_pid())
+    assert scheduler.acquire("m", PRIORITY_INTERACTIVE, timeout=0.3)
+    assert _waiter_count(scheduler) == 0
+
+
+def test_rows_older_than_their_priority_wait_are_purged(tmp_path):
+    scheduler = _scheduler(tmp_path, max_wait={PRIORITY_INTERACTIVE: 1.0, PRIORITY_BACKGROUND: 60.0})
+    _insert_orphan(scheduler, priority=PRIORITY_INTERACTIVE, enqueued_at=time.time() - 10, pid=None)
+    assert scheduler.acquire("m", PRIORITY_BACKGROUND, timeout=0.3)
+    assert _waiter_count(scheduler) == 0
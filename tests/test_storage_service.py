@@ -0,0 +1,160 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from services import storage_service
+from services.storage_service import LocalReadCache, S3Storage, new_storage_key
+
+
+def _client_error(code: str):
+    exc = storage_service.ClientError({"Error": {"Code": code}}, "HeadObject")
+    exc.response = {"Error": {"Code": code}}
+    return exc
+
+
+class StubS3Client:
+    """内存中的最小 S3 客户端，只实现 S3Storage 用到的接口"""
+
+    def __init__(self):
+        self.objects = {}
+        self.downloads = []
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise _client_error("404")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.objects[(bucket, key)] = fileobj.read()
+
+    def upload_file(self, filename, bucket, key):
+        self.objects[(bucket, key)] = Path(filename).read_bytes()
+
+    def download_file(self, bucket, key, filename):
+        if (bucket, key) not in self.objects:
+            raise _client_error("NoSuchKey")
+        self.downloads.append(key)
+        Path(filename).write_bytes(self.objects[(bucket, key)])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+@pytest.fixture
+def s3(tmp_path):
+    client = StubS3Client()
+    cache = LocalReadCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    return S3Storage("docs", cache, prefix="/uploads/", client=client), client
+
+
+def test_new_storage_key_keeps_filename_and_never_repeats():
+    keys = {new_storage_key("report.pdf") for _ in range(100)}
+    assert len(keys) == 100
+    assert all(key.endswith("_report.pdf") for key in keys)
+
+
+def test_s3_object_keys_use_prefix(s3):
+    storage, client = s3
+    storage.save_fileobj("a.txt", io.BytesIO(b"hello"))
+    assert ("docs", "uploads/a.txt") in client.objects
+    assert storage.exists("a.txt")
+    assert not storage.exists("missing.txt")
+    assert storage.size("a.txt") == 5
+
+
+def test_s3_put_file_removes_source(s3, tmp_path):
+    storage, client = s3
+    source = tmp_path / "download.bin"
+    source.write_bytes(b"payload")
+    storage.put_file("b.bin", source)
+    assert client.objects[("docs", "uploads/b.bin")] == b"payload"
+    assert not source.exists()
+
+
+def test_s3_local_path_reads_through_cache(s3):
+    storage, client = s3
+    storage.save_fileobj("a.txt", io.BytesIO(b"hello"))
+    first = storage.local_path("a.txt")
+    second = storage.local_path("a.txt")
+    assert first == second
+    assert first.read_bytes() == b"hello"
+    assert client.downloads == ["uploads/a.txt"]
+
+
+def test_s3_missing_object_raises_file_not_found(s3):
+    storage, _ = s3
+    with pytest.raises(FileNotFoundError):
+        storage.local_path("missing.txt")
+    with pytest.raises(FileNotFoundError):
+        storage.size("missing.txt")
+
+
+def test_s3_delete_discards_cached_copy(s3):
+    storage, client = s3
+    storage.save_fileobj("a.txt", io.BytesIO(b"hello"))
+    cached = storage.local_path("a.txt")
+    storage.delete("a.txt")
+    assert ("docs", "uploads/a.txt") not in client.objects
+    assert not cached.exists()
+
+
+def _fetch_bytes(size):
+    return lambda target: target.write_bytes(b"x" * size)
+
+
+def test_read_cache_evicts_least_recently_used(tmp_path):
+    cache = LocalReadCache(tmp_path / "cache", max_bytes=250, min_age_seconds=0)
+    first = cache.get_or_fetch("first.bin", _fetch_bytes(100))
+    second = cache.get_or_fetch("second.bin", _fetch_bytes(100))
+    cache.get_or_fetch("first.bin", _fetch_bytes(100))
+    third = cache.get_or_fetch("third.bin", _fetch_bytes(100))
+
+    assert first.exists()
+    assert not second.exists()
+    assert third.exists()
+
+
+def test_read_cache_evicts_down_to_low_water(tmp_path):
+    cache = LocalReadCache(tmp_path / "cache", max_bytes=1000, low_water=0.6, min_age_seconds=0)
+    paths = [cache.get_or_fetch(f"{index}.bin", _fetch_bytes(300)) for index in range(4)]
+    assert [path.exists() for path in paths] == [False, False, True, True]
+
+
+def test_read_cache_skips_recently_used_entries(tmp_path):
+    cache = LocalReadCache(tmp_path / "cache", max_bytes=150)
+    first = cache.get_or_fetch("first.bin", _fetch_bytes(100))
+    second = cache.get_or_fetch("second.bin", _fetch_bytes(100))
+    assert first.exists() and second.exists()
+
+
+def test_read_cache_keeps_entry_larger_than_budget(tmp_path):
+    cache = LocalReadCache(tmp_path / "cache", max_bytes=10, min_age_seconds=0)
+    path = cache.get_or_fetch("big.bin", _fetch_bytes(100))
+    assert path.exists()
+
+
+def test_read_cache_refetches_file_removed_after_hit(tmp_path):
+    cache = LocalReadCache(tmp_path / "cache", max_bytes=1024)
+    calls = []
+
+    def fetch(target):
+        calls.append(target)
+        target.write_bytes(b"data")
+
+    path = cache.get_or_fetch("a.bin", fetch)
+    path.unlink()
+    assert cache.get_or_fetch("a.bin", fetch).read_bytes() == b"data"
+    assert len(calls) == 2
+
+
+def test_read_cache_failed_fetch_leaves_no_temp_files(tmp_path):
+    cache = LocalReadCache(tmp_path / "cache", max_bytes=1024)
+
+    def broken(target):
+        target.write_bytes(b"partial")
+        raise FileNotFoundError("gone")
+
+    with pytest.raises(FileNotFoundError):
+        cache.get_or_fetch("gone.bin", broken)
+    assert [path for path in (tmp_path / "cache").rglob("*") if path.is_file() and not path.name.startswith(".index.db")] == []